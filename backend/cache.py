@@ -0,0 +1,132 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional
+from urllib.parse import urlencode
+
+from fastapi import Request
+
+# Cache configuration
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+class CachedResponse(NamedTuple):
+    """A serialized response body and the data generation it was computed from."""
+    body: bytes
+    etag: str
+    generation: str
+    media_type: str
+    expires_at: float
+
+def cache_key(request: Request) -> str:
+    """Builds a cache key from the route path and its sorted, non-empty query parameters."""
+    params = sorted((key, value) for key, value in request.query_params.multi_items() if value != "")
+    return f"{request.url.path}?{urlencode(params)}"
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the response body."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match header covers `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {candidate.strip() for candidate in header.split(",")}
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+class ResponseCache:
+    """
+    In-process LRU cache of serialized responses with a TTL.
+
+    Entries remember the database generation they were built from and are dropped as
+    soon as a lookup happens under a different generation, so a rerun of the
+    data_cleaning job invalidates the cache without any coordination.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES,
+                 ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._generation: Optional[str] = None
+        self._counters = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0, "invalidations": 0}
+
+    def _sync_generation(self, generation: str) -> None:
+        if generation != self._generation:
+            if self._entries:
+                self._counters["invalidations"] += 1
+            self.clear()
+            self._generation = generation
+
+    def get(self, key: str, generation: str) -> Optional[CachedResponse]:
+        """Returns the live entry for `key`, or None on a miss."""
+        self._sync_generation(generation)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self._counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._counters["hits"] += 1
+        return entry
+
+    def put(self, key: str, generation: str, body: bytes,
+            media_type: str = "application/json") -> CachedResponse:
+        """Stores a serialized body and returns the cache entry (with its ETag)."""
+        entry = CachedResponse(body, make_etag(body), generation, media_type, time.monotonic() + self.ttl)
+        self._sync_generation(generation)
+        if len(body) > self.max_bytes:
+            return entry
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._bytes += len(body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._counters["evictions"] += 1
+        return entry
+
+    def variant(self, key: str, entry: CachedResponse, encoding: str,
+                encode: Callable[[bytes], bytes]) -> CachedResponse:
+        """
+        The `encoding` variant of the live entry for `key`, such as its gzip-compressed body.
+
+        Variants are encoded on first use and cached next to the entry under their own key
+        and ETag, so they are evicted and invalidated like any other entry. Their lookups do
+        not count as hits or misses.
+        """
+        variant_key = f"{key}#{encoding}"
+        variant = self._entries.get(variant_key)
+        if variant is not None and variant.generation == entry.generation and variant.expires_at >= time.monotonic():
+            self._entries.move_to_end(variant_key)
+            return variant
+        return self.put(variant_key, entry.generation, encode(entry.body), entry.media_type)
+
+    def record_not_modified(self) -> None:
+        self._counters["not_modified"] += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns cache occupancy and hit/miss counters."""
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "generation": self._generation,
+            **self._counters,
+            "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else None,
+        }
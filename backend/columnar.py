@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    from pyarrow.fs import LocalFileSystem
+except ImportError:  # the Parquet read path is optional
+    pa = None
+
+from database import served_generation
+from dates import from_date_key
+from profiling import phase
+
+logger = logging.getLogger(__name__)
+
+# Partitioned Parquet copy of `sales` written by `data_cleaning --parquet`
+PARQUET_DIR = os.getenv("PARQUET_DIR", "/shared_data/parquet")
+# "parquet" answers the aggregation endpoints by scanning the Parquet copy, "memory" from
+# NumPy columns of `sales` held by each worker (see memory_store); the default "sqlite"
+# answers them from the rollup tables
+ANALYTICS_STORE = os.getenv("ANALYTICS_STORE", "sqlite")
+
+class ParquetStore:
+    """
+    Column-pruned scans over the Parquet copy of the sales rows.
+
+    Files are memory-mapped, so a scan only reads the columns and partitions it needs.
+    The copy is only used while its recorded generation matches the one being served (the
+    database's, or that of the batch snapshot being read), which keeps answers consistent
+    with the SQLite endpoints, the response cache and the other sub-queries of a batch.
+    `path` is a symlink to the directory of the current export; it is resolved when the
+    dataset is opened, so a scan never mixes files of two exports.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._generation: Optional[str] = None
+        self._dataset = None
+
+    def _read_generation(self, root: str) -> Optional[str]:
+        try:
+            with open(os.path.join(root, "_generation")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def dataset(self):
+        """The sales dataset, or None when the copy is missing or of another generation."""
+        root = os.path.realpath(self.path)
+        generation = self._read_generation(root)
+        if generation is None or generation != served_generation():
+            return None
+        with self._lock:
+            if generation != self._generation:
+                partitioning = ds.partitioning(pa.schema([("year", pa.string()), ("category", pa.string())]),
+                                               flavor="hive")
+                self._dataset = ds.dataset(
+                    os.path.join(root, "sales"),
+                    format="parquet",
+                    partitioning=partitioning,
+                    filesystem=LocalFileSystem(use_mmap=True)
+                )
+                self._generation = generation
+                logger.info(f"Opened Parquet store at {root} (generation {generation})")
+            return self._dataset
+
+    def daily_sales(self, start_key: Optional[int], end_key: Optional[int]) -> Optional[Tuple[List[str], List[tuple]]]:
+        """Total sales per day between two date keys, like the `daily_sales` rollup."""
+        dataset = self.dataset()
+        if dataset is None:
+            return None
+        # The year partition prunes whole directories, the date statistics row groups
+        conditions = []
+        if start_key is not None:
+            start = from_date_key(start_key)
+            conditions += [pc.field("year") >= start.strftime("%Y"), pc.field("date") >= start]
+        if end_key is not None:
+            end = from_date_key(end_key)
+            conditions += [pc.field("year") <= end.strftime("%Y"), pc.field("date") <= end]
+        with phase("scan"):
+            table = dataset.to_table(columns=["date", "total_sales"], filter=all_of(conditions))
+            totals = table.group_by("date").aggregate([("total_sales", "sum")]).sort_by("date")
+        return ["total_sales", "date"], list(zip(
+            totals.column("total_sales_sum").to_pylist(),
+            totals.column("date").cast(pa.string()).to_pylist()
+        ))
+
+    def product_sales(self, product: Optional[str], category: Optional[str]) -> Optional[Tuple[List[str], List[tuple]]]:
+        """Total sales per product, optionally for one category and/or product, by product name."""
+        dataset = self.dataset()
+        if dataset is None:
+            return None
+        conditions = []
+        if category:
+            conditions.append(pc.field("category") == category)
+        if product:
+            conditions.append(pc.field("product") == product)
+        with phase("scan"):
+            table = dataset.to_table(columns=["product", "total_sales"], filter=all_of(conditions))
+            totals = table.group_by("product").aggregate([("total_sales", "sum")])
+        # Products are dictionary-encoded, which Arrow cannot sort; the grouped keys are few.
+        # NULL sorts first, as in SQLite's ORDER BY
+        products = totals.column("product").cast(pa.string())
+        order = pc.sort_indices(pa.table({"product": products}), sort_keys=[("product", "ascending", "at_start")])
+        return ["total_sales", "product"], list(zip(
+            totals.column("total_sales_sum").take(order).to_pylist(),
+            products.take(order).to_pylist()
+        ))
+
+def all_of(conditions: list):
+    """Conjunction of dataset filter expressions, or None for no filter."""
+    condition = None
+    for clause in conditions:
+        condition = clause if condition is None else condition & clause
+    return condition
+
+_store: Optional[ParquetStore] = None
+_store_lock = threading.Lock()
+
+def get_parquet_store() -> Optional[ParquetStore]:
+    """The shared Parquet store when it is enabled and pyarrow is installed, else None."""
+    global _store
+    if ANALYTICS_STORE != "parquet":
+        return None
+    if pa is None:
+        logger.warning("ANALYTICS_STORE=parquet but pyarrow is not installed; using SQLite")
+        return None
+    with _store_lock:
+        if _store is None or _store.path != PARQUET_DIR:
+            _store = ParquetStore(PARQUET_DIR)
+        return _store
@@ -0,0 +1,61 @@
+import gzip
+import os
+from typing import Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+from profiling import phase
+
+# Compression configuration: bodies smaller than this are sent as they are, since the
+# framing overhead outweighs the savings
+COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 6
+
+def supported_encodings() -> List[str]:
+    """Content codings this worker can produce, most preferred first."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Parses an Accept-Encoding header into {coding: q-value}."""
+    accepted = {}
+    for part in header.split(","):
+        name, _, parameters = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+def negotiate_encoding(header: Optional[str]) -> Optional[str]:
+    """
+    The supported content coding the client prefers, or None to send the body as it is.
+    Ties in q-value go to the better compression ratio.
+    """
+    if not header:
+        return None
+    accepted = accepted_encodings(header)
+    best, best_quality = None, 0.0
+    for encoding in supported_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compresses a response body with a coding returned by `negotiate_encoding`."""
+    with phase("compress"):
+        if encoding == "br":
+            return brotli.compress(body, quality=BROTLI_QUALITY)
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
@@ -1,47 +1,540 @@
+import asyncio
+import contextvars
+import functools
+import os
+import queue
 import sqlite3
-import pandas as pd
-from typing import Optional, Dict, Any, Union
-from sqlalchemy import text
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, List, Tuple
+from urllib.parse import quote
 import logging
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
+from profiling import SLOW_QUERY_MS, log_slow_query, phase
+from serialization import ResponseLayout, encode_rows
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Database configuration
-DATABASE_PATH = "/shared_data/data.db"  # Update this with your actual database path
+DATABASE_PATH = os.getenv("DATABASE_PATH", "/shared_data/data.db")
+
+# Connection pool configuration
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Only safe when the file is never modified while the backend runs (no incremental refresh)
+IMMUTABLE = os.getenv("DB_IMMUTABLE", "0") == "1"
+# Reads through a memory map come straight from the OS page cache, which all workers share,
+# instead of being copied into each connection's own cache. The default maps the whole file;
+# SQLite clamps it to its compile-time maximum (2 GiB in standard builds).
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(2 ** 40)))
+CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", str(64 * 1024)))
+STATEMENT_CACHE_SIZE = 256
+
+# Async query execution: at most DB_MAX_CONCURRENCY queries run at once on a dedicated
+# thread pool; callers beyond that wait up to DB_QUEUE_TIMEOUT seconds, and at most
+# DB_MAX_WAITING of them may wait before new requests are rejected outright.
+MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", str(POOL_SIZE)))
+QUEUE_TIMEOUT = float(os.getenv("DB_QUEUE_TIMEOUT", "5"))
+MAX_WAITING = int(os.getenv("DB_MAX_WAITING", "64"))
+# A read snapshot keeps its pooled connection until its batch ends, and its sub-queries
+# still need executor slots. At most this many are open at once, fewer than the pool
+# size, so other queries always get a connection eventually and never hold every
+# slot while waiting for one.
+MAX_SNAPSHOTS = max(1, POOL_SIZE - 1)
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free within the pool timeout."""
+
+class ConnectionPool:
+    """
+    Pool of long-lived, read-only SQLite connections.
+
+    Connections are opened lazily up to `size` and handed to one borrower at a time,
+    so they can be used from any thread. Each one is opened with a `mode=ro` URI
+    (plus `immutable=1` when the file never changes underneath us) and tuned for
+    read-heavy use: memory-mapped I/O, a larger page cache, `query_only`, and a
+    prepared statement cache keyed by SQL text.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 immutable: bool = IMMUTABLE):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.immutable = immutable
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open_count = 0
+        self._in_use = 0
+        self._counters = {"acquired": 0, "waited": 0, "timeouts": 0, "opened": 0, "discarded": 0}
+        self._wait_seconds = 0.0
+
+    def _open(self) -> sqlite3.Connection:
+        uri = f"file:{quote(self.path)}?mode=ro"
+        if self.immutable:
+            uri += "&immutable=1"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrows a connection, opening a new one if the pool is not yet full."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                can_open = self._open_count < self.size
+                if can_open:
+                    self._open_count += 1
+            if can_open:
+                try:
+                    conn = self._open()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._open_count -= 1
+                    raise
+                with self._lock:
+                    self._counters["opened"] += 1
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._counters["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                with self._lock:
+                    self._counters["waited"] += 1
+                    self._wait_seconds += time.perf_counter() - started
+        with self._lock:
+            self._counters["acquired"] += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False) -> None:
+        """Returns a borrowed connection, closing it instead when `discard` is set."""
+        with self._lock:
+            self._in_use -= 1
+            if discard:
+                self._open_count -= 1
+                self._counters["discarded"] += 1
+        if discard:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection for the duration of the block."""
+        with phase("pool"):
+            conn = self.acquire()
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            # The connection may be unusable (e.g. the file was replaced); reopen next time
+            self.release(conn, discard=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def fill(self) -> int:
+        """Opens connections until the pool is full, so first requests do not pay for it. Returns how many."""
+        opened = []
+        try:
+            while True:
+                with self._lock:
+                    if self._open_count >= self.size:
+                        break
+                    self._open_count += 1
+                try:
+                    opened.append(self._open())
+                except sqlite3.Error:
+                    with self._lock:
+                        self._open_count -= 1
+                    raise
+                with self._lock:
+                    self._counters["opened"] += 1
+        finally:
+            for conn in opened:
+                self._idle.put(conn)
+        return len(opened)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns pool occupancy and usage counters."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._open_count,
+                "in_use": self._in_use,
+                "idle": self._open_count - self._in_use,
+                **self._counters,
+                "wait_seconds": round(self._wait_seconds, 6),
+            }
+
+    def close(self) -> None:
+        """Closes all idle connections."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._open_count -= 1
+            conn.close()
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Returns this worker's connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DATABASE_PATH:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE_PATH)
+        return _pool
+
+def close_pool() -> None:
+    """Closes the connection pool of this worker."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def warm_page_cache(path: Optional[str] = None) -> int:
+    """
+    Asks the kernel to read the database file into the OS page cache ahead of the first
+    queries. The read-ahead is asynchronous and, being shared, only costs I/O once for all
+    workers. Returns the file size.
+    """
+    path = path or DATABASE_PATH
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+    return size
+
+def _file_signature(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+class GenerationTracker:
+    """
+    Tracks the data generation id written to `refresh_state` by the data_cleaning job.
+
+    The id is only re-read when the database or its WAL file changes on disk (a pair
+    of `stat` calls), so checking it on every request is cheap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        self._generation: Optional[str] = None
+
+    def current(self) -> str:
+        signature = (DATABASE_PATH, _file_signature(DATABASE_PATH), _file_signature(f"{DATABASE_PATH}-wal"))
+        with self._lock:
+            if signature != self._signature or self._generation is None:
+                self._generation = self._read(signature)
+                self._signature = signature
+            return self._generation
+
+    def _read(self, signature) -> str:
+        # A short-lived connection rather than a pooled one: this runs on the event loop
+        # and must never wait for a busy pool.
+        try:
+            conn = sqlite3.connect(f"file:{quote(DATABASE_PATH)}?mode=ro", uri=True)
+            try:
+                generation = read_generation(conn)
+            finally:
+                conn.close()
+            if generation is not None:
+                return generation
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read database generation: {e}")
+        # Databases built before generations were recorded: fall back to the file identity
+        return "-".join(str(part) for part in signature[1] or ())
+
+def read_generation(conn: sqlite3.Connection) -> Optional[str]:
+    """The generation id recorded in `refresh_state`, or None for databases without one."""
+    try:
+        row = conn.execute("SELECT value FROM refresh_state WHERE key = 'generation'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row is not None else None
+
+_generation_tracker = GenerationTracker()
+
+def database_generation() -> str:
+    """Returns the current generation id of the database."""
+    return _generation_tracker.current()
+
+class Snapshot:
+    """
+    A pooled connection held inside one read transaction.
+
+    Every query of the transaction sees the database as of its first read, even if the
+    data_cleaning job commits a refresh meanwhile. Queries issued while the snapshot is
+    current (see `read_snapshot`) take turns on its connection.
+    """
+
+    def __init__(self, pool: ConnectionPool, conn: sqlite3.Connection, generation: str):
+        self.pool = pool
+        self.conn = conn
+        self.generation = generation
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        with phase("pool"):
+            self._lock.acquire()
+        try:
+            yield self.conn
+        finally:
+            self._lock.release()
+
+    def close(self) -> None:
+        """Ends the transaction, after any query still running on it, and returns the connection."""
+        with self._lock:
+            try:
+                self.conn.rollback()
+            except sqlite3.DatabaseError:
+                self.pool.release(self.conn, discard=True)
+            else:
+                self.pool.release(self.conn)
+
+_snapshot: contextvars.ContextVar[Optional[Snapshot]] = contextvars.ContextVar("read_snapshot", default=None)
+
+def current_snapshot() -> Optional[Snapshot]:
+    """The snapshot that queries of the current context read from, if any."""
+    return _snapshot.get()
+
+def served_generation() -> str:
+    """The generation queries of the current context read: their snapshot's, else the database's."""
+    snapshot = _snapshot.get()
+    return snapshot.generation if snapshot is not None else database_generation()
+
+def open_snapshot(fallback_generation: str) -> Snapshot:
+    """Borrows a connection and starts a read transaction on it."""
+    pool = get_pool()
+    with phase("pool"):
+        conn = pool.acquire()
+    try:
+        conn.execute("BEGIN")
+        # The first read of the transaction fixes the snapshot
+        conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        generation = read_generation(conn) or fallback_generation
+    except sqlite3.DatabaseError:
+        pool.release(conn, discard=True)
+        raise
+    return Snapshot(pool, conn, generation)
+
+_snapshot_slots: Optional[asyncio.Semaphore] = None
+_snapshot_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def snapshot_slots() -> asyncio.Semaphore:
+    """The semaphore of MAX_SNAPSHOTS open snapshots, for the running event loop."""
+    global _snapshot_slots, _snapshot_slots_loop
+    loop = asyncio.get_running_loop()
+    if _snapshot_slots is None or _snapshot_slots_loop is not loop:
+        _snapshot_slots = asyncio.Semaphore(MAX_SNAPSHOTS)
+        _snapshot_slots_loop = loop
+    return _snapshot_slots
+
+@asynccontextmanager
+async def read_snapshot():
+    """
+    Makes every query issued inside the block, including from tasks it starts, read from one
+    consistent snapshot of the database. Yields the snapshot.
+
+    Waits on the event loop, without an executor slot, while MAX_SNAPSHOTS are open, and
+    raises DatabaseBusy after QUEUE_TIMEOUT seconds.
+    """
+    slots = snapshot_slots()
+    with phase("queue"):
+        try:
+            await asyncio.wait_for(slots.acquire(), QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise DatabaseBusy(f"No read snapshot available after {QUEUE_TIMEOUT}s")
+    try:
+        snapshot = await get_executor().run(open_snapshot, database_generation())
+        token = _snapshot.set(snapshot)
+        try:
+            yield snapshot
+        finally:
+            _snapshot.reset(token)
+            snapshot.close()
+    finally:
+        slots.release()
 
 @contextmanager
 def get_connection():
-    """Context manager for database connections."""
-    conn = None
+    """Context manager for database connections borrowed from the pool, or from the current snapshot."""
+    snapshot = _snapshot.get()
+    if snapshot is not None:
+        with snapshot.connection() as conn:
+            yield conn
+        return
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        yield conn
+        with get_pool().connection() as conn:
+            yield conn
     except sqlite3.Error as e:
         logger.error(f"Database connection error: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
-def query_to_df(
+def query_rows(
     query: str,
     params: Optional[Dict[str, Any]] = None
-) -> pd.DataFrame:
+) -> Tuple[List[str], List[tuple]]:
     """
-    Executes a SQL query and returns the result as a pandas DataFrame.
-    Handles raw SQL strings and SQLAlchemy text objects.
+    Executes a SQL query and returns its column names and plain row tuples.
+    Skips DataFrame construction for callers that only need to serialize the rows.
     """
-
     try:
         with get_connection() as conn:
-            return pd.read_sql_query(query, conn, params=params)
+            started = time.perf_counter()
+            with phase("db"):
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(query, params or {})
+                columns = [description[0] for description in cursor.description]
+                rows = cursor.fetchall()
+            elapsed = time.perf_counter() - started
+            if elapsed * 1000 >= SLOW_QUERY_MS:
+                log_slow_query(conn, query, params, elapsed)
+            return columns, rows
     except sqlite3.Error as e:
         logger.error(f"Database query error: {e}")
         raise
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        raise
\ No newline at end of file
+
+def query_json(
+    query: str,
+    params: Optional[Dict[str, Any]] = None,
+    layout: ResponseLayout = "records"
+) -> bytes:
+    """Executes a SQL query and encodes the result straight to response bytes in `layout`."""
+    columns, rows = query_rows(query, params)
+    return encode_rows(columns, rows, layout)
+
+class DatabaseBusy(Exception):
+    """Raised when the query executor is saturated and a request cannot be queued."""
+
+class QueryExecutor:
+    """
+    Runs blocking database calls on a bounded thread pool so that async handlers
+    never block the event loop.
+
+    A semaphore caps the number of in-flight queries; waiting callers give up after
+    `queue_timeout` seconds and are rejected immediately once `max_waiting` are queued.
+    """
+
+    def __init__(self, concurrency: int = MAX_CONCURRENCY, queue_timeout: float = QUEUE_TIMEOUT,
+                 max_waiting: int = MAX_WAITING):
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self.max_waiting = max_waiting
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sqlite-query")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = 0
+        self._waiting = 0
+        self._counters = {"completed": 0, "rejected": 0, "timed_out": 0}
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Runs `func(*args, **kwargs)` on the executor once a slot is free."""
+        semaphore = self._get_semaphore()
+        with phase("queue"):
+            await self._acquire(semaphore)
+
+        self._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            # Carry the request context into the worker thread so its phases are recorded
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+        finally:
+            self._running -= 1
+            self._counters["completed"] += 1
+            semaphore.release()
+
+    async def _acquire(self, semaphore: asyncio.Semaphore) -> None:
+        if semaphore.locked():
+            if self._waiting >= self.max_waiting:
+                self._counters["rejected"] += 1
+                raise DatabaseBusy("Too many queued database queries")
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._counters["timed_out"] += 1
+                raise DatabaseBusy(f"No query slot available after {self.queue_timeout}s")
+            finally:
+                self._waiting -= 1
+        else:
+            await semaphore.acquire()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns executor occupancy and counters."""
+        return {
+            "concurrency": self.concurrency,
+            "running": self._running,
+            "waiting": self._waiting,
+            **self._counters,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+_executor: Optional[QueryExecutor] = None
+
+def get_executor() -> QueryExecutor:
+    """Returns this worker's query executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = QueryExecutor()
+    return _executor
+
+def shutdown_executor() -> None:
+    """Stops the query executor of this worker."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+async def query_rows_async(
+    query: str,
+    params: Optional[Dict[str, Any]] = None
+) -> Tuple[List[str], List[tuple]]:
+    """Async variant of `query_rows` that runs on the bounded executor."""
+    return await get_executor().run(query_rows, query, params)
+
+async def query_json_async(
+    query: str,
+    params: Optional[Dict[str, Any]] = None,
+    layout: ResponseLayout = "records"
+) -> bytes:
+    """Async variant of `query_json`; encoding also happens off the event loop."""
+    return await get_executor().run(query_json, query, params, layout)
\ No newline at end of file
@@ -0,0 +1,23 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# Sales dates are stored as days since this epoch (see the data_cleaning schema)
+EPOCH = date(1970, 1, 1)
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def to_date_key(date_str: str) -> int:
+    """Converts a YYYY-MM-DD string to the day number used as the sales date key."""
+    return (datetime.strptime(date_str, "%Y-%m-%d").date() - EPOCH).days
+
+def from_date_key(key: int) -> date:
+    """The date of a sales date key."""
+    return EPOCH + timedelta(days=key)
+
+def key_dates(keys: np.ndarray) -> np.ndarray:
+    """`datetime64[D]` values of an array of sales date keys."""
+    return np.datetime64(EPOCH, "D") + keys.astype("timedelta64[D]")
+
+def date_keys(dates: np.ndarray) -> np.ndarray:
+    """Sales date keys of an array of `datetime64` values."""
+    return (dates.astype("datetime64[D]") - np.datetime64(EPOCH, "D")).astype(np.int64)
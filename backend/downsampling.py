@@ -0,0 +1,37 @@
+from typing import List, Sequence
+
+import numpy as np
+
+def lttb(x: Sequence[float], y: Sequence[float], threshold: int) -> List[int]:
+    """
+    Indices of at most `threshold` points of a series that keep its visual shape.
+
+    Largest-Triangle-Three-Buckets: the first and last points are kept, the rest are split
+    into `threshold - 2` buckets, and from each bucket the point forming the largest
+    triangle with the previously kept point and the mean of the next bucket is kept.
+    `x` must be increasing. Series no longer than `threshold` are returned whole.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    xs = np.asarray(x, dtype=float)
+    ys = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_start = end
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        mean_x = xs[next_start:next_end].mean()
+        mean_y = ys[next_start:next_end].mean()
+        areas = np.abs(
+            (xs[previous] - mean_x) * (ys[start:end] - ys[previous])
+            - (xs[previous] - xs[start:end]) * (mean_y - ys[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept.append(previous)
+    kept.append(n - 1)
+    return kept
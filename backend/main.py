@@ -1,18 +1,126 @@
-from fastapi import FastAPI, HTTPException, Query
-from typing import Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Tuple, Union
+import asyncio
+import base64
+import functools
+import json
 import logging
+import os
 from datetime import datetime
-from database import query_to_df
-from models import CategoryStats
+from urllib.parse import urlencode
+from cache import ResponseCache, cache_key, etag_matches
+from columnar import get_parquet_store
+from compression import COMPRESSION_MIN_BYTES, compress, negotiate_encoding
+from database import (
+    DatabaseBusy,
+    close_pool,
+    current_snapshot,
+    database_generation,
+    get_executor,
+    get_pool,
+    query_json_async,
+    query_rows_async,
+    read_snapshot,
+    shutdown_executor,
+    warm_page_cache
+)
+from dates import DAY_NAMES, to_date_key
+from downsampling import lttb
+from memory_store import get_memory_store
+from models import BatchRequest, BatchResponse, CategoryStats, SalesTotal
+from profiling import ProfilingMiddleware, metrics, note
+from serialization import JSON_MEDIA_TYPE, ResponseLayout, dumps, encode_rows, json_object, media_type
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MIN_DATE_KEY = -2 ** 31
+MAX_DATE_KEY = 2 ** 31 - 1
+
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_QUERIES = 16
+# Entries of the batch request's ASGI scope that its sub-queries inherit
+SUBQUERY_SCOPE_KEYS = ("type", "asgi", "http_version", "scheme", "server", "client", "root_path", "state")
+# Scope of the requests the worker makes to itself to warm its cache
+WARM_SCOPE = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http",
+              "server": None, "client": None, "root_path": ""}
+
+# Point counts the dashboard's daily sales plot requests: none until it has measured its
+# width, then one of DAILY_POINTS_LEVELS in frontend/app.py. The two lists are kept in
+# sync by hand, since the frontend and backend are deployed separately.
+WARM_DAILY_POINTS = [None, 64, 128, 256, 512, 1024, 2048]
+# Responses computed when a worker starts and again whenever the data changes, so that
+# dashboard loads are cache hits: the exact requests of an unfiltered dashboard (Arrow
+# frames, column-oriented category statistics, the first outliers page) plus the default
+# layouts for other clients
+WARM_QUERIES = [
+    ("/sales/filter_values", {}),
+    ("/sales/category", {}),
+    ("/sales/category", {"format": "columns"}),
+    ("/sales/product", {}),
+    ("/sales/product", {"format": "arrow"}),
+    ("/sales/day", {}),
+    *(("/sales/day", {"format": "arrow", **({"points": points} if points else {})}) for points in WARM_DAILY_POINTS),
+    ("/sales/day/total", {}),
+    ("/sales/outliers", {"limit": 5, "offset": 0}),
+]
+CACHE_WARMUP = os.getenv("CACHE_WARMUP", "1") == "1"
+# How often each worker checks in the background whether a new snapshot was published
+GENERATION_POLL_SECONDS = float(os.getenv("GENERATION_POLL_SECONDS", "2"))
+
+# Time grains of /sales/day: the expression grouping `date_key` into buckets and the
+# rendered start date of each bucket. Weeks start on Monday; day 0 was a Thursday.
+SalesBucket = Literal["day", "week", "month"]
+DAILY_BUCKETS = {
+    "day": ("date_key", "date(date_key * 86400, 'unixepoch')"),
+    "week": ("(date_key + 3) / 7", "date(((date_key + 3) / 7 * 7 - 3) * 86400, 'unixepoch')"),
+    "month": ("strftime('%Y-%m', date_key * 86400, 'unixepoch')",
+              "strftime('%Y-%m-01', date_key * 86400, 'unixepoch')"),
+}
+MAX_POINTS = 100_000
+
+# The columns of `outliers_view`, selected from the base table so that filters and sorts
+# can work on the encoded columns. Each entry is (select expression, kind).
+OUTLIER_COLUMNS = {
+    "transaction_id": ("t.transaction_id", "number"),
+    "date": ("date(t.date_key * 86400, 'unixepoch')", "date"),
+    "category": ("c.category", "category"),
+    "product": ("p.product", "product"),
+    "quantity": ("t.quantity", "number"),
+    "price": ("t.price", "number"),
+    "total_sales": ("t.total_sales", "number"),
+    "day_of_week": (
+        "CASE t.day_of_week " + " ".join(f"WHEN {number} THEN '{name}'" for number, name in enumerate(DAY_NAMES)) + " END",
+        "weekday"
+    ),
+    "high_volume": ("t.high_volume", "number"),
+}
+# Dates and weekdays sort by their stored number rather than their rendered text
+OUTLIER_SORT_EXPRESSIONS = {"date": "t.date_key", "day_of_week": "t.day_of_week"}
+OUTLIER_TABLES = (
+    "FROM outliers t"
+    " LEFT JOIN categories c ON c.category_id = t.category_id"
+    " LEFT JOIN products p ON p.product_id = t.product_id"
+)
+DICTIONARY_TABLES = {"category": "categories", "product": "products"}
+COMPARISONS = {"eq": "=", "ne": "!=", "lt": "<", "le": "<=", "gt": ">", "ge": ">="}
+
+response_cache = ResponseCache()
+
 app = FastAPI(
     title="Sales Analytics API",
     description="API for querying sales data across products, categories, and time periods",
     version="1.0.0"
 )
+app.add_middleware(ProfilingMiddleware)
+
+@app.exception_handler(DatabaseBusy)
+async def database_busy_handler(request: Request, exc: DatabaseBusy) -> JSONResponse:
+    """Sheds load with a 503 when the query executor is saturated."""
+    logger.warning(f"Rejecting {request.url.path}: {exc}")
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 def validate_date_format(date_str: Optional[str]) -> None:
     """Validates if the provided date string matches YYYY-MM-DD format."""
@@ -25,93 +133,574 @@ def validate_date_format(date_str: Optional[str]) -> None:
                 detail="Invalid date format. Please use 'YYYY-MM-DD'"
             )
 
+def layout_query(description: str = "Response layout: list of records, one array per column, or an Arrow IPC stream") -> Any:
+    """Declares the optional `format` query parameter shared by the tabular endpoints."""
+    return Query("records", alias="format", description=description)
+
+async def cached_response(request: Request, load: Callable[[], Awaitable[bytes]],
+                          body_type: str = JSON_MEDIA_TYPE) -> Response:
+    """
+    Serves the `body_type` bytes produced by `load()` through the response cache.
+
+    Entries are keyed by route and normalized query parameters and are invalidated when
+    the database generation changes. Bodies of COMPRESSION_MIN_BYTES or more are sent in the
+    client's preferred Accept-Encoding coding; the compressed variants are cached as well,
+    each with its own ETag. Requests whose If-None-Match matches the current ETag get an
+    empty 304.
+    """
+    generation = database_generation()
+    snapshot = current_snapshot()
+    if snapshot is not None and snapshot.generation != generation:
+        # A batch whose snapshot predates a refresh: its data must neither come from nor enter the cache
+        note("cache", "bypass")
+        return Response(content=await load(), media_type=body_type)
+    key = cache_key(request)
+    entry = response_cache.get(key, generation)
+    note("cache", "hit" if entry is not None else "miss")
+    if entry is None:
+        entry = response_cache.put(key, generation, await load(), body_type)
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None and len(entry.body) >= COMPRESSION_MIN_BYTES:
+        entry = response_cache.variant(key, entry, encoding, functools.partial(compress, encoding=encoding))
+        headers["Content-Encoding"] = encoding
+    headers["ETag"] = entry.etag
+    if etag_matches(request, entry.etag):
+        response_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+async def fetch_filter_values() -> bytes:
+    """Loads unique product and category values for filtering."""
+    (_, categories), (_, products) = await asyncio.gather(
+        query_rows_async("SELECT category FROM categories ORDER BY category"),
+        query_rows_async("SELECT product FROM products ORDER BY product")
+    )
+    return dumps({
+        "categories": [row[0] for row in categories],
+        "products": [row[0] for row in products]
+    })
+
 @app.get("/sales/filter_values", response_model=Dict)
-async def get_filter_values() -> List[Dict]:
+async def get_filter_values(request: Request) -> Response:
     """Retrieves unique product and category values for filtering."""
-    df_categories = query_to_df("SELECT DISTINCT category FROM sales")
-    df_products = query_to_df("SELECT DISTINCT product FROM sales")
-    return {
-        "categories": df_categories["category"].tolist(),
-        "products": df_products["product"].tolist()
-    }
+    return await cached_response(request, fetch_filter_values)
+
+async def fetch_products(
+    product: Optional[str] = None,
+    category: Optional[str] = None,
+    layout: ResponseLayout = "records"
+) -> bytes:
+    """Loads product sales data with optional filtering."""
+    memory = get_memory_store()
+    if memory is not None:
+        result = await get_executor().run(memory.product_sales, product, category)
+        if result is not None:
+            return encode_rows(*result, layout)
+
+    store = get_parquet_store()
+    if store is not None:
+        result = await get_executor().run(store.product_sales, product, category)
+        if result is not None:
+            return encode_rows(*result, layout)
+
+    base_query = "SELECT sum(total_sales) as total_sales, product_id FROM sales_by_product"
+    conditions = []
+    params = {}
+
+    if category:
+        conditions.append("category_id = (SELECT category_id FROM categories WHERE category = :category)")
+        params["category"] = category
+    if product:
+        conditions.append("product_id = (SELECT product_id FROM products WHERE product = :product)")
+        params["product"] = product
+
+    if conditions:
+        base_query += " WHERE " + " AND ".join(conditions)
+    base_query += " GROUP BY product_id"
+    query = (
+        "SELECT t.total_sales, p.product"
+        f" FROM ({base_query}) t LEFT JOIN products p ON p.product_id = t.product_id"
+        " ORDER BY p.product"
+    )
+    return await query_json_async(query, params, layout)
 
 @app.get("/sales/product", response_model=List[Dict])
 async def get_products(
+    request: Request,
     product: Optional[str] = Query(None, description="Product name to filter by"),
-    category: Optional[str] = Query(None, description="Category name to filter by")
-) -> List[Dict]:
+    category: Optional[str] = Query(None, description="Category name to filter by"),
+    layout: ResponseLayout = layout_query()
+) -> Response:
     """Retrieves product sales data with optional filtering."""
-    base_query = "SELECT sum(total_sales) as total_sales, product FROM sales"
-    params = {}
+    return await cached_response(request, lambda: fetch_products(product, category, layout), media_type(layout))
 
-    if product and category:
-        base_query += " WHERE product = :product AND category = :category"
-        params["product"] = product
-        params["category"] = category
-    elif product:
-        base_query += " WHERE product = :product"
-        params["product"] = product
-    elif category:
-        base_query += " WHERE category = :category"
-        params["category"] = category
+def downsample(rows: List[tuple], points: Optional[int]) -> List[tuple]:
+    """Reduces (total_sales, date, x) rows to at most `points` with LTTB and drops the x column."""
+    if points is not None and len(rows) > points:
+        rows = [rows[index] for index in lttb([row[2] for row in rows], [row[0] or 0 for row in rows], points)]
+    return [row[:2] for row in rows]
 
-    base_query += " GROUP BY product"
-    df = query_to_df(base_query, params)
-    return df.to_dict(orient="records")
+async def fetch_daily_sales(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    layout: ResponseLayout = "records",
+    bucket: SalesBucket = "day",
+    points: Optional[int] = None
+) -> bytes:
+    """
+    Loads sales per day, week or month within an optional date range.
 
-@app.get("/sales/day", response_model=List[Dict])
-async def get_daily_sales(
-    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
-) -> List[Dict]:
-    """Retrieves daily sales data within an optional date range."""
+    Buckets are summed in SQL. With `points`, a longer series is reduced to that many
+    points by LTTB, which keeps peaks and troughs, so the payload is bounded for any range.
+    """
     validate_date_format(start_date)
     validate_date_format(end_date)
 
-    base_query = "SELECT sum(total_sales) as total_sales, date FROM sales"
+    memory = get_memory_store()
+    if memory is not None:
+        result = await get_executor().run(
+            memory.daily_sales,
+            to_date_key(start_date) if start_date else None,
+            to_date_key(end_date) if end_date else None,
+            bucket
+        )
+        if result is not None:
+            columns, rows = result
+            return encode_rows(columns[:2], downsample(rows, points), layout)
+
+    store = get_parquet_store()
+    if store is not None and bucket == "day":
+        result = await get_executor().run(
+            store.daily_sales,
+            to_date_key(start_date) if start_date else None,
+            to_date_key(end_date) if end_date else None
+        )
+        if result is not None:
+            columns, rows = result
+            if points is not None:
+                rows = downsample([(total, day, to_date_key(day)) for total, day in rows], points)
+            return encode_rows(columns, rows, layout)
+
+    group, label = DAILY_BUCKETS[bucket]
+    if bucket == "day":
+        base_query = f"SELECT total_sales, {label} as date, date_key as x FROM daily_sales"
+    else:
+        base_query = f"SELECT sum(total_sales) as total_sales, {label} as date, min(date_key) as x FROM daily_sales"
     params = {}
 
     if start_date and end_date:
-        base_query += " WHERE date BETWEEN :start_date AND :end_date"
-        params["start_date"] = start_date
-        params["end_date"] = end_date
+        base_query += " WHERE date_key BETWEEN :start_key AND :end_key"
+        params["start_key"] = to_date_key(start_date)
+        params["end_key"] = to_date_key(end_date)
     elif start_date:
-        base_query += " WHERE date >= :start_date"
-        params["start_date"] = start_date
+        base_query += " WHERE date_key >= :start_key"
+        params["start_key"] = to_date_key(start_date)
     elif end_date:
-        base_query += " WHERE date <= :end_date"
-        params["end_date"] = end_date
+        base_query += " WHERE date_key <= :end_key"
+        params["end_key"] = to_date_key(end_date)
+
+    if bucket != "day":
+        base_query += f" GROUP BY {group}"
+    base_query += " ORDER BY x"
+    if points is None:
+        # The x column only feeds the downsampling
+        return await query_json_async(f"SELECT total_sales, date FROM ({base_query})", params, layout)
+    columns, rows = await query_rows_async(base_query, params)
+    return encode_rows(columns[:2], downsample(rows, points), layout)
 
-    base_query += " GROUP BY date"
-    df = query_to_df(base_query, params)
-    return df.to_dict(orient="records")
+@app.get("/sales/day", response_model=List[Dict])
+async def get_daily_sales(
+    request: Request,
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    bucket: SalesBucket = Query("day", description="Sum sales per day, week (from Monday) or month"),
+    points: Optional[int] = Query(None, ge=3, le=MAX_POINTS,
+                                  description="Downsample longer series to this many points, keeping their shape"),
+    layout: ResponseLayout = layout_query()
+) -> Response:
+    """Retrieves sales per day, week or month within an optional date range, optionally downsampled."""
+    validate_date_format(start_date)
+    validate_date_format(end_date)
+    return await cached_response(
+        request,
+        lambda: fetch_daily_sales(start_date, end_date, layout, bucket, points),
+        media_type(layout)
+    )
+
+async def fetch_sales_total(start_date: Optional[str] = None, end_date: Optional[str] = None) -> bytes:
+    """Loads total sales within an optional date range from the daily prefix sums."""
+    validate_date_format(start_date)
+    validate_date_format(end_date)
+
+    query = """
+        SELECT
+            coalesce((SELECT cumulative_sales FROM daily_sales WHERE date_key <= :end_key
+                      ORDER BY date_key DESC LIMIT 1), 0)
+            - coalesce((SELECT cumulative_sales FROM daily_sales WHERE date_key < :start_key
+                        ORDER BY date_key DESC LIMIT 1), 0) AS total_sales
+    """
+    params = {
+        "start_key": to_date_key(start_date) if start_date else MIN_DATE_KEY,
+        "end_key": to_date_key(end_date) if end_date else MAX_DATE_KEY
+    }
+    _, rows = await query_rows_async(query, params)
+    total = SalesTotal(start_date=start_date, end_date=end_date, total_sales=rows[0][0])
+    return dumps(jsonable_encoder(total))
+
+@app.get("/sales/day/total", response_model=SalesTotal)
+async def get_sales_total(
+    request: Request,
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
+) -> Response:
+    """Retrieves total sales within an optional date range from the daily prefix sums."""
+    validate_date_format(start_date)
+    validate_date_format(end_date)
+    return await cached_response(request, lambda: fetch_sales_total(start_date, end_date))
+
+async def fetch_category_stats(layout: ResponseLayout = "records") -> bytes:
+    """Loads aggregated sales statistics by category, shaped like `CategoryStats`."""
+    revenue, mean, day = await asyncio.gather(
+        query_json_async("SELECT * FROM category_revenue", layout=layout),
+        query_json_async("SELECT * FROM category_mean", layout=layout),
+        query_json_async("SELECT * FROM category_day", layout=layout)
+    )
+    return json_object({"revenue": revenue, "mean": mean, "day": day})
 
 @app.get("/sales/category", response_model=CategoryStats)
-async def get_sales_category() -> CategoryStats:
+async def get_sales_category(request: Request, layout: ResponseLayout = layout_query()) -> Response:
     """Retrieves aggregated sales statistics by category."""
-    return CategoryStats(
-        revenue=query_to_df("SELECT * FROM category_revenue").to_dict(orient="records"),
-        mean=query_to_df("SELECT * FROM category_mean").to_dict(orient="records"),
-        day=query_to_df("SELECT * FROM category_day").to_dict(orient="records")
+    if layout == "arrow":
+        # An Arrow stream holds a single table, and this response bundles three
+        raise HTTPException(status_code=400, detail="The category statistics have no Arrow layout; use 'columns'")
+    return await cached_response(request, lambda: fetch_category_stats(layout))
+
+def outlier_filter_condition(spec: str, name: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Translates a `column:operator:value` filter into a SQL condition on the outliers table.
+
+    Equality on categories and products resolves the dictionary id first so the
+    (category_id, quantity) index applies; dates and weekdays compare their stored numbers.
+    """
+    parts = spec.split(":", 2)
+    if len(parts) != 3 or not parts[2]:
+        raise HTTPException(status_code=400, detail="Invalid filter. Please use 'column:operator:value'")
+    column, operator, value = parts
+    if column not in OUTLIER_COLUMNS or operator not in {*COMPARISONS, "contains", "starts"}:
+        raise HTTPException(status_code=400, detail=f"Unsupported filter '{spec}'")
+
+    expression, kind = OUTLIER_COLUMNS[column]
+    if operator in ("contains", "starts"):
+        pattern = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{pattern}%" if operator == "contains" else f"{pattern}%"
+        return f"CAST({expression} AS TEXT) LIKE :{name} ESCAPE '\\'", {name: pattern}
+
+    comparison = COMPARISONS[operator]
+    if kind == "number":
+        try:
+            return f"{expression} {comparison} :{name}", {name: float(value)}
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Filter value for '{column}' must be numeric")
+    if kind == "date":
+        validate_date_format(value)
+        return f"t.date_key {comparison} :{name}", {name: to_date_key(value)}
+    if kind == "weekday" and value in DAY_NAMES:
+        return f"t.day_of_week {comparison} :{name}", {name: DAY_NAMES.index(value)}
+    if kind in DICTIONARY_TABLES and operator == "eq":
+        return f"t.{kind}_id = (SELECT {kind}_id FROM {DICTIONARY_TABLES[kind]} WHERE {kind} = :{name})", {name: value}
+    return f"{expression} {comparison} :{name}", {name: value}
+
+def encode_cursor(sort_by: Optional[str], descending: bool, value: Any, row_id: int) -> str:
+    """Packs the sort key of the last row on a page into an opaque keyset cursor."""
+    return base64.urlsafe_b64encode(json.dumps([sort_by, descending, value, row_id]).encode()).decode()
+
+def decode_cursor(cursor: str, sort_by: Optional[str], descending: bool) -> Tuple[Any, int]:
+    """Unpacks a keyset cursor, rejecting cursors issued for a different sort order."""
+    try:
+        cursor_sort_by, cursor_descending, value, row_id = json.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort_by != sort_by or cursor_descending != descending or not isinstance(row_id, int):
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    return value, row_id
+
+def keyset_condition(sort_expression: Optional[str], descending: bool, value: Any) -> str:
+    """
+    Builds the condition selecting rows after the cursor position in
+    `ORDER BY sort_expression, rowid`. SQLite sorts NULLs first ascending and last descending.
+    """
+    after = "<" if descending else ">"
+    if sort_expression is None:
+        return f"t.rowid {after} :after_row"
+    if value is None:
+        if descending:
+            return f"({sort_expression} IS NULL AND t.rowid < :after_row)"
+        return f"(({sort_expression} IS NULL AND t.rowid > :after_row) OR {sort_expression} IS NOT NULL)"
+    condition = (
+        f"{sort_expression} {after} :after_value"
+        f" OR ({sort_expression} = :after_value AND t.rowid {after} :after_row)"
     )
+    if descending:
+        condition += f" OR {sort_expression} IS NULL"
+    return f"({condition})"
+
+async def fetch_outliers(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    descending: bool = False,
+    filters: Optional[List[str]] = None,
+    layout: ResponseLayout = "records"
+) -> bytes:
+    """
+    Loads sales data points identified as outliers, filtered and sorted in SQL.
+
+    Without a `limit` the full list is returned as before. With one, the response is a page
+    `{"rows", "total", "limit", "offset", "next_cursor"}`; passing `next_cursor` back continues
+    after the last row by keyset, while `offset` allows jumping to an arbitrary page. In the
+    Arrow layout a page is the rows, with the other fields in the schema metadata.
+    """
+    if sort_by is not None and sort_by not in OUTLIER_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort column '{sort_by}'")
+
+    conditions, params = [], {}
+    for number, spec in enumerate(filters or []):
+        condition, condition_params = outlier_filter_condition(spec, f"filter_{number}")
+        conditions.append(condition)
+        params.update(condition_params)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    sort_expression = OUTLIER_SORT_EXPRESSIONS.get(sort_by, OUTLIER_COLUMNS[sort_by][0]) if sort_by else None
+    direction = " DESC" if descending else ""
+    order = f" ORDER BY {sort_expression}{direction}, t.rowid{direction}" if sort_by else f" ORDER BY t.rowid{direction}"
+    select = "SELECT " + ", ".join(f"{expression} AS {name}" for name, (expression, _) in OUTLIER_COLUMNS.items())
+
+    if limit is None:
+        return await query_json_async(f"{select} {OUTLIER_TABLES}{where}{order}", params, layout)
 
-@app.get("/sales/outliers", response_model=List[Dict])
-async def get_outliers() -> List[Dict]:
-    """Retrieves sales data points identified as outliers."""
-    df = query_to_df("SELECT * FROM outliers")
-    return df.to_dict(orient="records")
+    page_conditions, page_params = list(conditions), dict(params, limit=limit + 1, offset=offset)
+    if cursor is not None:
+        page_params["after_value"], page_params["after_row"] = decode_cursor(cursor, sort_by, descending)
+        page_conditions.append(keyset_condition(sort_expression, descending, page_params["after_value"]))
+    page_where = " WHERE " + " AND ".join(page_conditions) if page_conditions else ""
+
+    (columns, rows), (_, count) = await asyncio.gather(
+        query_rows_async(
+            f"{select}, {sort_expression or 'NULL'} AS sort_key, t.rowid AS row_id"
+            f" {OUTLIER_TABLES}{page_where}{order} LIMIT :limit OFFSET :offset",
+            page_params
+        ),
+        query_rows_async(f"SELECT count(*) {OUTLIER_TABLES}{where}", params)
+    )
+    # One extra row was fetched to tell whether another page follows
+    next_cursor = encode_cursor(sort_by, descending, *rows[limit - 1][-2:]) if len(rows) > limit else None
+    page = {"total": count[0][0], "limit": limit, "offset": offset, "next_cursor": next_cursor}
+    encoded_rows = encode_rows(columns[:-2], [row[:-2] for row in rows[:limit]], layout, page)
+    if layout == "arrow":
+        return encoded_rows
+    return json_object({"rows": encoded_rows, **{name: dumps(value) for name, value in page.items()}})
+
+@app.get("/sales/outliers", response_model=Union[List[Dict], Dict])
+async def get_outliers(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for the full list"),
+    offset: int = Query(0, ge=0, description="Rows to skip, counted from the cursor when one is given"),
+    cursor: Optional[str] = Query(None, description="`next_cursor` of the previous page"),
+    sort_by: Optional[str] = Query(None, description="Column to sort by"),
+    descending: bool = Query(False, description="Sort in descending order"),
+    filters: List[str] = Query(
+        [],
+        alias="filter",
+        description="Repeatable 'column:operator:value' filter; operators are eq, ne, lt, le, gt, ge, contains, starts"
+    ),
+    layout: ResponseLayout = layout_query()
+) -> Response:
+    """Retrieves sales data points identified as outliers, optionally paginated, filtered and sorted."""
+    return await cached_response(
+        request,
+        lambda: fetch_outliers(limit, offset, cursor, sort_by, descending, filters, layout),
+        media_type(layout)
+    )
+
+def subquery_string(params: Dict[str, Any]) -> bytes:
+    """Encodes sub-query parameters as a GET query string; list values repeat their name."""
+    items = []
+    for name, value in params.items():
+        for item in value if isinstance(value, list) else [value]:
+            if item is not None:
+                items.append((name, item if isinstance(item, str) else json.dumps(item)))
+    return urlencode(items).encode()
+
+async def run_subquery(
+    base_scope: Dict[str, Any],
+    path: str,
+    params: Dict[str, Any]
+) -> Tuple[int, Optional[str], Optional[str], bytes]:
+    """
+    Serves a sub-query as a GET request through the whole app, so it gets the same
+    validation, caching, error responses and metrics as a direct request. The request
+    inherits the connection details of `base_scope`. Returns its status, ETag, media type
+    and body; an exception raised while serving it becomes a 500 of this sub-query alone.
+    """
+    if not path.startswith("/sales/"):
+        return 404, None, JSON_MEDIA_TYPE, dumps({"detail": "Not Found"})
+    scope = {key: base_scope[key] for key in SUBQUERY_SCOPE_KEYS if key in base_scope}
+    scope.update(method="GET", path=path, raw_path=path.encode(), query_string=subquery_string(params), headers=[])
+    start, chunks = {}, []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            start.update(message)
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # The server error middleware re-raises after sending a plain-text 500, which is
+        # replaced by the JSON error body of the other failed sub-queries
+        logger.exception(f"Batch sub-query {path} failed")
+        return 500, None, JSON_MEDIA_TYPE, dumps({"detail": "Internal Server Error"})
+    headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in start.get("headers", [])}
+    return start.get("status", 500), headers.get("etag"), headers.get("content-type"), b"".join(chunks)
+
+@app.post("/batch", response_model=BatchResponse)
+async def run_batch(request: Request, batch: BatchRequest) -> Response:
+    """
+    Answers up to MAX_BATCH_QUERIES GET sub-queries under /sales/ in one round trip.
+
+    The sub-queries run concurrently against one read snapshot of the database, so their
+    results never mix data from before and after a refresh. Each result carries its own
+    status, so a rejected sub-query does not fail the others. JSON bodies are embedded as
+    they are, others (such as Arrow streams) as base64 strings.
+    """
+    if not batch.queries or len(batch.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"A batch takes 1 to {MAX_BATCH_QUERIES} queries")
+    async with read_snapshot() as snapshot:
+        results = await asyncio.gather(*(run_subquery(request.scope, query.path, query.params) for query in batch.queries))
+    encoded = []
+    for query, (status, etag, body_type, body) in zip(batch.queries, results):
+        if body_type != JSON_MEDIA_TYPE:
+            body = dumps(base64.b64encode(body).decode("ascii"))
+        encoded.append(json_object({
+            "path": dumps(query.path), "status": dumps(status), "etag": dumps(etag),
+            "media_type": dumps(body_type), "body": body
+        }))
+    content = json_object({"generation": dumps(snapshot.generation), "results": b"[" + b",".join(encoded) + b"]"})
+    headers = {"Cache-Control": "no-store", "Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None and len(content) >= COMPRESSION_MIN_BYTES:
+        content = compress(content, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+async def warm_cache() -> str:
+    """
+    Computes the WARM_QUERIES responses into this worker's response cache, all from one
+    snapshot. Returns the generation they were computed from.
+    """
+    async with read_snapshot() as snapshot:
+        results = await asyncio.gather(*(run_subquery(WARM_SCOPE, path, params) for path, params in WARM_QUERIES))
+    failed = [path for (path, _), (status, *_) in zip(WARM_QUERIES, results) if status != 200]
+    if failed:
+        logger.warning(f"Could not warm {', '.join(failed)}")
+    return snapshot.generation
+
+async def watch_generation(generation: Optional[str]) -> None:
+    """
+    Re-warms the response cache whenever the data_cleaning job publishes a new snapshot.
+
+    Every request already checks the generation, so workers never serve stale data; this
+    only makes sure the first requests after a refresh find warm entries. All workers poll
+    the same file, so they re-warm within GENERATION_POLL_SECONDS of each other.
+    """
+    while True:
+        await asyncio.sleep(GENERATION_POLL_SECONDS)
+        current = database_generation()
+        if current == generation:
+            continue
+        # Recorded first so that a failing warm-up is not retried until the next refresh
+        generation = current
+        logger.info(f"Database generation changed to {current}, warming the response cache")
+        try:
+            await warm_cache()
+        except Exception as e:
+            logger.warning(f"Could not warm the response cache: {e}")
+
+_generation_watcher: Optional["asyncio.Task[None]"] = None
 
 @app.on_event("startup")
 async def startup_event():
-    """Run startup tasks."""
-    logger.info("Starting Sales Analytics API")
+    """
+    Warms this worker before it takes traffic: starts reading the database into the OS page
+    cache (shared by all workers through mmap), opens the pooled connections and computes
+    the hot responses, then keeps them warm across data refreshes.
+    """
+    global _generation_watcher
+    logger.info(f"Starting Sales Analytics API (worker {os.getpid()})")
+    generation = None
+    try:
+        size = warm_page_cache()
+        opened = await get_executor().run(get_pool().fill)
+        memory = get_memory_store()
+        if memory is not None:
+            await get_executor().run(memory.load)
+        if CACHE_WARMUP:
+            generation = await warm_cache()
+        logger.info(f"Warmed {size / 2 ** 20:.1f} MiB of database pages, {opened} connections"
+                    f" and {len(WARM_QUERIES) if CACHE_WARMUP else 0} responses")
+    except Exception as e:
+        # The database may not be built yet; requests compute what they need once it is
+        logger.warning(f"Skipping startup warm-up: {e}")
+    if CACHE_WARMUP:
+        _generation_watcher = asyncio.create_task(watch_generation(generation))
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run cleanup tasks."""
     logger.info("Shutting down Sales Analytics API")
+    if _generation_watcher is not None:
+        _generation_watcher.cancel()
+    shutdown_executor()
+    close_pool()
 
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@app.get("/generation")
+def get_generation() -> Dict:
+    """Reports the data generation; it changes whenever the data_cleaning job rewrites the database."""
+    return {"generation": database_generation()}
+
+@app.get("/stats")
+def get_stats() -> Dict:
+    """Reports connection pool, query executor and response cache statistics for this worker."""
+    return {
+        "worker": os.getpid(),
+        "pool": get_pool().stats(),
+        "queries": get_executor().stats(),
+        "cache": response_cache.stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    """Exposes this worker's request metrics in the Prometheus text format."""
+    pool, queries, cache = get_pool().stats(), get_executor().stats(), response_cache.stats()
+    samples = {
+        "sqlite_pool_connections_in_use": ("gauge", "Pooled connections currently borrowed.", pool["in_use"]),
+        "sqlite_pool_wait_seconds_total": ("counter", "Time spent waiting for a pooled connection.",
+                                           pool["wait_seconds"]),
+        "query_executor_running": ("gauge", "Queries running on the executor.", queries["running"]),
+        "query_executor_waiting": ("gauge", "Queries waiting for an executor slot.", queries["waiting"]),
+        "response_cache_entries": ("gauge", "Entries in the response cache.", cache["entries"]),
+        "response_cache_hits_total": ("counter", "Requests answered from the response cache.", cache["hits"]),
+        "response_cache_misses_total": ("counter", "Requests that missed the response cache.", cache["misses"]),
+    }
+    return PlainTextResponse(metrics.render(samples), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -0,0 +1,242 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+import database
+from columnar import ANALYTICS_STORE
+from database import current_snapshot, database_generation, read_generation, served_generation
+from dates import date_keys, key_dates
+from profiling import phase
+
+logger = logging.getLogger(__name__)
+
+SALES_COLUMNS_QUERY = (
+    "SELECT coalesce(category_id, 0) AS category_id, coalesce(product_id, 0) AS product_id,"
+    " date_key, total_sales FROM sales"
+)
+
+def positions_index(codes: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sorted-position index of a code column in CSR layout: the rows holding code `c` are
+    `order[offsets[c]:offsets[c + 1]]`, in ascending row order.
+    """
+    order = np.argsort(codes, kind="stable").astype(np.int32)
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=size), out=offsets[1:])
+    return order, offsets
+
+def dictionary(rows: List[tuple]) -> Tuple[dict, np.ndarray]:
+    """Name-to-id map and id-to-name array of a dictionary table; id 0 stands for NULL."""
+    ids = {name: key for key, name in rows}
+    names = np.full(max(ids.values(), default=0) + 1, None, dtype=object)
+    for name, key in ids.items():
+        names[key] = name
+    return ids, names
+
+def name_ranks(names: np.ndarray, size: int) -> np.ndarray:
+    """Position of each of `size` codes when ordered by name, unnamed codes (NULL) first like SQLite."""
+    padded = list(names) + [None] * (size - len(names))
+    order = sorted(range(size), key=lambda code: (padded[code] is not None, padded[code] or ""))
+    ranks = np.empty(size, dtype=np.int64)
+    ranks[order] = np.arange(size)
+    return ranks
+
+def sql_div(values: np.ndarray, divisor: int) -> np.ndarray:
+    """Integer division truncating toward zero, like SQLite's `/` on integers."""
+    return np.where(values >= 0, values // divisor, -(-values // divisor))
+
+def date_labels(keys: np.ndarray) -> List[str]:
+    """YYYY-MM-DD strings of day keys."""
+    return np.datetime_as_string(key_dates(keys), unit="D").tolist()
+
+class SalesColumns:
+    """
+    The `sales` rows of one database generation as NumPy columns.
+
+    Categories and products keep their dictionary ids as codes, with 0 for NULL. Rows are
+    sorted by day and every category and product has a sorted-position index of its rows.
+    Per-day and per-product totals are precomputed, so a date range is a slice of the
+    distinct days found by binary search. Instances never change after
+    construction; a reload builds a new one.
+    """
+
+    def __init__(self, generation: str, frame: pd.DataFrame, categories: List[tuple], products: List[tuple]):
+        self.generation = generation
+        order = np.argsort(frame["date_key"].to_numpy(), kind="stable")
+        self.day = frame["date_key"].to_numpy(np.int32)[order]
+        self.category = frame["category_id"].to_numpy(np.int32)[order]
+        self.product = frame["product_id"].to_numpy(np.int32)[order]
+        self.total_sales = frame["total_sales"].to_numpy(np.float64)[order]
+        self.category_ids, self.category_names = dictionary(categories)
+        self.product_ids, self.product_names = dictionary(products)
+        # Codes beyond the dictionaries would only come from a corrupt file; size for them anyway
+        self.category_count = max(len(self.category_names), int(self.category.max(initial=0)) + 1)
+        self.product_count = max(len(self.product_names), int(self.product.max(initial=0)) + 1)
+        self.category_index = positions_index(self.category, self.category_count)
+        self.product_index = positions_index(self.product, self.product_count)
+        self.product_ranks = name_ranks(self.product_names, self.product_count)
+        # Unfiltered group sums, the hot path of both endpoints, are computed once per load
+        self.product_totals = self.group_sums(None)
+        self.days, day_starts = np.unique(self.day, return_index=True)
+        self.day_totals = np.add.reduceat(self.total_sales, day_starts) if len(self.day) else self.total_sales
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def nbytes(self) -> int:
+        arrays = [self.day, self.category, self.product, self.total_sales, *self.category_index, *self.product_index,
+                  self.product_ranks, self.days, self.day_totals]
+        return sum(array.nbytes for array in arrays)
+
+    def rows_of(self, index: Tuple[np.ndarray, np.ndarray], ids: dict, name: str) -> np.ndarray:
+        code = ids.get(name)
+        if code is None:
+            return np.empty(0, dtype=np.int32)
+        order, offsets = index
+        return order[offsets[code]:offsets[code + 1]]
+
+    def select(self, product: Optional[str], category: Optional[str]) -> Optional[np.ndarray]:
+        """Ascending positions of the rows matching the filters; None selects every row."""
+        if product:
+            positions = self.rows_of(self.product_index, self.product_ids, product)
+            if category:
+                positions = positions[self.category[positions] == self.category_ids.get(category, -1)]
+            return positions
+        if category:
+            return self.rows_of(self.category_index, self.category_ids, category)
+        return None
+
+    def group_sums(self, positions: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Product codes present among the rows at `positions` (None for all), by name, and their sales sums."""
+        codes = self.product if positions is None else self.product[positions]
+        weights = self.total_sales if positions is None else self.total_sales[positions]
+        sums = np.bincount(codes, weights=weights, minlength=self.product_count)
+        present = np.flatnonzero(np.bincount(codes, minlength=self.product_count))
+        present = present[np.argsort(self.product_ranks[present])]
+        return present, sums[present]
+
+    def product_sales(self, product: Optional[str], category: Optional[str]) -> Tuple[List[str], List[tuple]]:
+        """Total sales per product, optionally for one category and/or product, by product name."""
+        positions = self.select(product, category)
+        present, sums = self.product_totals if positions is None else self.group_sums(positions)
+        return ["total_sales", "product"], list(zip(sums.tolist(), self.product_names[present].tolist()))
+
+    def daily_sales(self, start_key: Optional[int], end_key: Optional[int],
+                    bucket: str = "day") -> Tuple[List[str], List[tuple]]:
+        """
+        Total sales per day, week (from Monday) or month between two date keys, like the
+        `daily_sales` query of the API. Rows are (total_sales, date, x), x being the first
+        day with sales in the bucket.
+        """
+        start = np.searchsorted(self.days, start_key, "left") if start_key is not None else 0
+        end = np.searchsorted(self.days, end_key, "right") if end_key is not None else len(self.days)
+        if start >= end:
+            return ["total_sales", "date", "x"], []
+        day_keys = self.days[start:end].astype(np.int64)
+        day_sums = self.day_totals[start:end]
+
+        if bucket == "day":
+            labels, totals, xs = date_labels(day_keys), day_sums, day_keys
+        else:
+            if bucket == "week":
+                bucket_keys = sql_div(day_keys + 3, 7)
+            else:
+                bucket_keys = key_dates(day_keys).astype("datetime64[M]").astype(np.int64)
+            # Day keys are sorted, so each bucket is one run
+            starts = np.flatnonzero(np.diff(bucket_keys, prepend=bucket_keys[0] - 1))
+            totals = np.add.reduceat(day_sums, starts)
+            xs = day_keys[starts]
+            if bucket == "week":
+                labels = date_labels(bucket_keys[starts] * 7 - 3)
+            else:
+                labels = date_labels(date_keys(bucket_keys[starts].astype("datetime64[M]")))
+        return ["total_sales", "date", "x"], list(zip(totals.tolist(), labels, xs.tolist()))
+
+def load_sales_columns(path: str) -> SalesColumns:
+    """Reads `sales` and the dictionaries from one read transaction of the database at `path`."""
+    conn = sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True)
+    try:
+        conn.execute("BEGIN")
+        generation = read_generation(conn) or database_generation()
+        frame = pd.read_sql_query(SALES_COLUMNS_QUERY, conn)
+        categories = conn.execute("SELECT category_id, category FROM categories").fetchall()
+        products = conn.execute("SELECT product_id, product FROM products").fetchall()
+    finally:
+        conn.close()
+    return SalesColumns(generation, frame, categories, products)
+
+class MemoryStore:
+    """
+    Answers the product and daily sales endpoints from `sales` held in memory as NumPy
+    columns, with vectorized masks and bincount group sums instead of SQL.
+
+    The columns are used only while their generation is the one being served. When the
+    database changes, the next request reloads them and the new columns replace the old
+    ones in a single assignment, so a request sees either the old or the new columns,
+    never a mix. Requests that arrive during a reload fall back to SQL instead of waiting.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._columns: Optional[SalesColumns] = None
+
+    def load(self) -> Optional[SalesColumns]:
+        """
+        The columns of the generation being served, reloading stale ones first. Returns None,
+        for the caller to use SQL, while another thread is reloading or when a batch reads an
+        older snapshot.
+        """
+        generation = served_generation()
+        columns = self._columns
+        if columns is not None and columns.generation == generation:
+            return columns
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            columns = self._columns
+            if (columns is None or columns.generation != generation) and current_snapshot() is None:
+                started = time.perf_counter()
+                with phase("load"):
+                    columns = self._columns = load_sales_columns(self.path)
+                logger.info(f"Loaded {len(columns)} sales rows ({columns.nbytes() / 2 ** 20:.1f} MiB) into memory"
+                            f" in {time.perf_counter() - started:.2f}s (generation {columns.generation})")
+        finally:
+            self._lock.release()
+        return columns if columns is not None and columns.generation == generation else None
+
+    def product_sales(self, product: Optional[str], category: Optional[str]) -> Optional[Tuple[List[str], List[tuple]]]:
+        """See `SalesColumns.product_sales`; None when the columns are unavailable."""
+        columns = self.load()
+        if columns is None:
+            return None
+        with phase("memory"):
+            return columns.product_sales(product, category)
+
+    def daily_sales(self, start_key: Optional[int], end_key: Optional[int],
+                    bucket: str = "day") -> Optional[Tuple[List[str], List[tuple]]]:
+        """See `SalesColumns.daily_sales`; None when the columns are unavailable."""
+        columns = self.load()
+        if columns is None:
+            return None
+        with phase("memory"):
+            return columns.daily_sales(start_key, end_key, bucket)
+
+_store: Optional[MemoryStore] = None
+_store_lock = threading.Lock()
+
+def get_memory_store() -> Optional[MemoryStore]:
+    """This worker's in-memory store when ANALYTICS_STORE=memory, else None."""
+    global _store
+    if ANALYTICS_STORE != "memory":
+        return None
+    with _store_lock:
+        if _store is None or _store.path != database.DATABASE_PATH:
+            _store = MemoryStore(database.DATABASE_PATH)
+        return _store
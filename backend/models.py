@@ -1,8 +1,36 @@
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
 
 class CategoryStats(BaseModel):
     """Model for category-wise statistics"""
     revenue: List[Dict]
     mean: List[Dict]
-    day: List[Dict]
\ No newline at end of file
+    day: List[Dict]
+
+class SalesTotal(BaseModel):
+    """Model for total sales over a date range"""
+    start_date: Optional[str]
+    end_date: Optional[str]
+    total_sales: float
+
+class BatchQuery(BaseModel):
+    """Model for one sub-query of a batch: a GET route under /sales/ and its query parameters"""
+    path: str
+    params: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    """Model for a batch of sub-queries answered from one database snapshot"""
+    queries: List[BatchQuery]
+
+class BatchResult(BaseModel):
+    """Model for the response of one sub-query; non-JSON bodies are base64-encoded"""
+    path: str
+    status: int
+    etag: Optional[str]
+    media_type: Optional[str]
+    body: Any
+
+class BatchResponse(BaseModel):
+    """Model for the responses of a batch, in request order"""
+    generation: str
+    results: List[BatchResult]
@@ -0,0 +1,210 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Profiling configuration
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestTimings:
+    """
+    Time spent by one request in each phase: `queue` (waiting for a query slot), `pool`
+    (borrowing or opening a connection), `db` (executing and fetching), `scan` (Parquet
+    scans), `load` (reading `sales` into memory), `memory` (in-memory queries), `encode`
+    (serialization) and `compress` (response compression).
+
+    Phases are summed, and the queries of a request may run concurrently, so the phases
+    can add up to more than the request's wall time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases: Dict[str, float] = {}
+        self.notes: Dict[str, str] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def note(self, name: str, description: str) -> None:
+        """Attaches a duration-less entry, such as the cache outcome, to the Server-Timing header."""
+        self.notes[name] = description
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+def current_timings() -> Optional[RequestTimings]:
+    """The timings of the request being served, or None outside of a request."""
+    return _current.get()
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Adds the time spent in the block to phase `name` of the current request."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+def note(name: str, description: str) -> None:
+    """Attaches a note to the current request's Server-Timing header, if any."""
+    timings = _current.get()
+    if timings is not None:
+        timings.note(name, description)
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip([*map(repr, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+def label_string(labels: Dict[str, Any]) -> str:
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+class Metrics:
+    """
+    Per-worker request metrics: a latency histogram and request counts per route, the
+    time spent in each phase per route, and the number of slow queries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency: Dict[Tuple[str, str], Histogram] = {}
+        self._requests: Dict[Tuple[str, str, int], int] = {}
+        self._phases: Dict[Tuple[str, str], float] = {}
+        self.slow_queries = 0
+
+    def record(self, method: str, route: str, status: int, seconds: float, timings: RequestTimings) -> None:
+        with self._lock:
+            histogram = self._latency.get((method, route))
+            if histogram is None:
+                histogram = self._latency[(method, route)] = Histogram()
+            histogram.observe(seconds)
+            self._requests[(method, route, status)] = self._requests.get((method, route, status), 0) + 1
+            for name, phase_seconds in timings.phases.items():
+                self._phases[(route, name)] = self._phases.get((route, name), 0.0) + phase_seconds
+
+    def record_slow_query(self) -> None:
+        with self._lock:
+            self.slow_queries += 1
+
+    def render(self, samples: Optional[Dict[str, Tuple[str, str, float]]] = None) -> str:
+        """
+        The metrics in the Prometheus text exposition format, followed by `samples`, which
+        maps more metric names to their type ("gauge" or "counter"), help text and value.
+        """
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (method, route), histogram in sorted(self._latency.items()):
+                labels = {"method": method, "route": route}
+                for bound, count in histogram.cumulative():
+                    lines.append(f"http_request_duration_seconds_bucket{label_string({**labels, 'le': bound})} {count}")
+                lines.append(f"http_request_duration_seconds_sum{label_string(labels)} {histogram.sum!r}")
+                lines.append(f"http_request_duration_seconds_count{label_string(labels)} {sum(histogram.counts)}")
+            lines += [
+                "# HELP http_requests_total Requests by route and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f"http_requests_total{label_string({'method': method, 'route': route, 'status': status})} {count}")
+            lines += [
+                "# HELP http_request_phase_seconds_total Time spent in each request phase by route.",
+                "# TYPE http_request_phase_seconds_total counter",
+            ]
+            for (route, name), seconds in sorted(self._phases.items()):
+                lines.append(f"http_request_phase_seconds_total{label_string({'route': route, 'phase': name})} {seconds!r}")
+            lines += [
+                "# HELP sqlite_slow_queries_total Queries slower than SLOW_QUERY_MS.",
+                "# TYPE sqlite_slow_queries_total counter",
+                f"sqlite_slow_queries_total {self.slow_queries}",
+            ]
+        for name, (kind, description, value) in (samples or {}).items():
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def server_timing(timings: RequestTimings, total: float) -> str:
+    """The Server-Timing header value for a request, durations in milliseconds."""
+    entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.phases.items()]
+    entries += [f'{name};desc="{description}"' for name, description in timings.notes.items()]
+    entries.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(entries)
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that times every HTTP request, records it in `metrics` under its route
+    template and, when SERVER_TIMING is on, reports the phase breakdown in a `Server-Timing`
+    response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    header = server_timing(timings, time.perf_counter() - start)
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"server-timing", header.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            # Unmatched paths share one label so that scans cannot inflate the series count
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.record(scope["method"], route, status, time.perf_counter() - start, timings)
+
+def log_slow_query(conn, query: str, params: Optional[Dict[str, Any]], seconds: float) -> None:
+    """Logs a query that exceeded SLOW_QUERY_MS together with its query plan."""
+    metrics.record_slow_query()
+    try:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params or {}).fetchall()
+        plan_lines = "\n".join(f"  {row[0]}|{row[1]}| {row[3]}" for row in plan)
+    except Exception as e:
+        plan_lines = f"  (no plan: {e})"
+    logger.warning(f"Slow query ({seconds * 1000:.1f} ms): {' '.join(query.split())} params={params}\n{plan_lines}")
@@ -0,0 +1,63 @@
+import json
+from typing import Any, Dict, List, Literal, Optional, Sequence
+
+try:
+    import pyarrow as pa
+except ImportError:  # the Arrow layout is optional
+    pa = None
+
+from profiling import phase
+
+# "records" is the historical list-of-objects shape; "columns" maps each column name to
+# the list of its values, which avoids repeating keys on every row; "arrow" is an Arrow
+# IPC stream holding one record batch, which clients can read without parsing text.
+ResponseLayout = Literal["records", "columns", "arrow"]
+JSON_MEDIA_TYPE = "application/json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def media_type(layout: ResponseLayout) -> str:
+    """The media type of a response encoded in `layout`."""
+    return ARROW_MEDIA_TYPE if layout == "arrow" else JSON_MEDIA_TYPE
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON encoding matching FastAPI's default JSONResponse."""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def encode_rows(columns: Sequence[str], rows: List[tuple], layout: ResponseLayout = "records",
+                metadata: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Encodes raw cursor rows without building intermediate DataFrames.
+
+    `metadata` only applies to the Arrow layout, where it is stored JSON-encoded in the
+    schema metadata; JSON callers wrap the rows themselves.
+    """
+    with phase("encode"):
+        if layout == "records":
+            return dumps([dict(zip(columns, row)) for row in rows])
+        values = list(zip(*rows)) if rows else [() for _ in columns]
+        if layout == "columns":
+            return dumps({column: list(column_values) for column, column_values in zip(columns, values)})
+        return encode_arrow(columns, values, metadata)
+
+def encode_arrow(columns: Sequence[str], values: List[tuple], metadata: Optional[Dict[str, Any]] = None) -> bytes:
+    """Encodes column values as an Arrow IPC stream with one record batch."""
+    if pa is None:
+        raise RuntimeError("The Arrow layout requires pyarrow")
+    arrays = []
+    for column_values in values:
+        array = pa.array(column_values)
+        # Text columns (dates, categories, products, weekdays) repeat a few values
+        arrays.append(array.dictionary_encode() if pa.types.is_string(array.type) else array)
+    table = pa.table(
+        arrays,
+        names=list(columns),
+        metadata={key: dumps(value) for key, value in (metadata or {}).items()}
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def json_object(parts: Dict[str, bytes]) -> bytes:
+    """Assembles a JSON object from already-encoded member values."""
+    return b"{" + b",".join(dumps(key) + b":" + value for key, value in parts.items()) + b"}"
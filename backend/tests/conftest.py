@@ -0,0 +1,53 @@
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The backend modules import each other as top-level modules, and the test database is
+# built by the data_cleaning package next to the backend
+sys.path[:0] = [BACKEND_DIR, os.path.dirname(BACKEND_DIR)]
+
+import database  # noqa: E402
+import main  # noqa: E402
+from data_cleaning.DataCleaningSetUp import main as build_database  # noqa: E402
+
+@pytest.fixture(scope="session")
+def built_database(tmp_path_factory):
+    """A small database built by the data_cleaning pipeline, spanning a year boundary."""
+    rng = np.random.default_rng(0)
+    rows = 600
+    sales = pd.DataFrame({
+        'transaction_id': np.arange(1, rows + 1),
+        'date': (pd.Timestamp('2023-12-01') + pd.to_timedelta(rng.integers(0, 106, rows), unit='D')).strftime('%Y-%m-%d'),
+        'category': rng.choice(['Widget', 'Gadget', 'Doodad'], rows),
+        # Products are missing on some rows, so sorts and group sums meet NULLs
+        'product': rng.choice(['A', 'B', 'C', None], rows, p=[0.3, 0.3, 0.3, 0.1]),
+        # A few large quantities per category become outliers, with ties to page through
+        'quantity': rng.choice([1, 2, 3, 60, 70], rows, p=[0.3, 0.3, 0.3, 0.05, 0.05]),
+        'price': rng.choice(['9.99', '4.5', '20'], rows),
+    })
+    directory = tmp_path_factory.mktemp("database")
+    csv_path = directory / "data.csv"
+    sales.to_csv(csv_path, index=False)
+    db_file = directory / "data.db"
+    build_database(str(csv_path), str(db_file))
+    return db_file
+
+@pytest.fixture
+def db_file(built_database, tmp_path, monkeypatch):
+    """A private copy of the test database, served by the backend for one test."""
+    db_file = tmp_path / "data.db"
+    shutil.copy(built_database, db_file)
+    monkeypatch.setattr(database, "DATABASE_PATH", str(db_file))
+    main.response_cache.clear()
+    yield db_file
+    database.close_pool()
+
+@pytest.fixture
+def client(db_file):
+    return TestClient(main.app)
@@ -0,0 +1,209 @@
+import asyncio
+import base64
+import sqlite3
+
+import httpx
+import pytest
+
+import columnar
+import database
+import main
+from data_cleaning.DataCleaningSetUp import export_parquet
+
+# Tests for keyset pagination of /sales/outliers
+def all_outliers(client, sort_by, descending):
+    params = {'descending': str(descending).lower()}
+    if sort_by:
+        params['sort_by'] = sort_by
+    response = client.get("/sales/outliers", params=params)
+    assert response.status_code == 200
+    return response.json(), params
+
+@pytest.mark.parametrize("sort_by", [None, 'quantity', 'product', 'date', 'total_sales'])
+@pytest.mark.parametrize("descending", [False, True])
+def test_outliers_cursor_pages_cover_the_sorted_list(client, sort_by, descending):
+    expected, params = all_outliers(client, sort_by, descending)
+    assert len(expected) > 10
+
+    rows, cursor = [], None
+    while True:
+        page = client.get("/sales/outliers", params={**params, 'limit': 4, **({'cursor': cursor} if cursor else {})}).json()
+        assert page['total'] == len(expected)
+        rows += page['rows']
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert rows == expected
+
+def test_outliers_offset_pages_match_cursor_pages(client):
+    first = client.get("/sales/outliers", params={'limit': 4, 'sort_by': 'quantity'}).json()
+    by_cursor = client.get("/sales/outliers", params={'limit': 4, 'sort_by': 'quantity', 'cursor': first['next_cursor']})
+    by_offset = client.get("/sales/outliers", params={'limit': 4, 'sort_by': 'quantity', 'offset': 4})
+    assert by_cursor.json()['rows'] == by_offset.json()['rows']
+
+def test_outliers_cursor_must_match_sort_order(client):
+    page = client.get("/sales/outliers", params={'limit': 4, 'sort_by': 'quantity'}).json()
+
+    other_order = client.get("/sales/outliers", params={'limit': 4, 'sort_by': 'quantity', 'descending': 'true',
+                                                        'cursor': page['next_cursor']})
+    assert other_order.status_code == 400
+    garbage = client.get("/sales/outliers", params={'limit': 4, 'cursor': 'not-a-cursor'})
+    assert garbage.status_code == 400
+
+# Tests for cached responses and their ETags
+def test_matching_etag_gets_empty_304(client):
+    response = client.get("/sales/product")
+    etag = response.headers['etag']
+
+    revalidated = client.get("/sales/product", headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b''
+    assert revalidated.headers['etag'] == etag
+    assert client.get("/sales/product", headers={'If-None-Match': '"stale"'}).status_code == 200
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_compressed_variants_have_their_own_etag(client, monkeypatch, encoding):
+    if encoding == "br":
+        pytest.importorskip("brotli")
+    monkeypatch.setattr(main, "COMPRESSION_MIN_BYTES", 0)
+    plain = client.get("/sales/day", headers={'Accept-Encoding': 'identity'})
+
+    # The HTTP client decodes the body, so the variant must hold the same JSON
+    compressed = client.get("/sales/day", headers={'Accept-Encoding': encoding})
+    assert compressed.headers['content-encoding'] == encoding
+    assert compressed.json() == plain.json()
+    assert compressed.headers['etag'] != plain.headers['etag']
+    revalidated = client.get("/sales/day", headers={'Accept-Encoding': encoding,
+                                                    'If-None-Match': compressed.headers['etag']})
+    assert revalidated.status_code == 304
+
+def test_etag_changes_with_the_data_generation(client, db_file):
+    etag = client.get("/sales/filter_values").headers['etag']
+
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("INSERT INTO categories (category_id, category) VALUES (100, 'Zeppelin')")
+        conn.execute("UPDATE refresh_state SET value = 'refreshed' WHERE key = 'generation'")
+
+    response = client.get("/sales/filter_values", headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Zeppelin' in response.json()['categories']
+    assert response.headers['etag'] != etag
+
+# Tests for POST /batch
+def test_batch_results_match_direct_requests(client):
+    queries = [
+        {'path': '/sales/filter_values'},
+        {'path': '/sales/day', 'params': {'bucket': 'week', 'points': 5}},
+        {'path': '/sales/outliers', 'params': {'limit': 3, 'sort_by': 'total_sales', 'descending': True}},
+        {'path': '/sales/product', 'params': {'format': 'arrow'}},
+    ]
+    batch = client.post("/batch", json={'queries': queries})
+    assert batch.status_code == 200
+
+    assert batch.json()['generation'] == client.get("/generation").json()['generation']
+    for query, result in zip(queries, batch.json()['results']):
+        params = {name: str(value).lower() if isinstance(value, bool) else value
+                  for name, value in query.get('params', {}).items()}
+        direct = client.get(query['path'], params=params)
+        assert result['status'] == 200
+        assert result['etag'] == direct.headers['etag']
+        if result['media_type'] == main.JSON_MEDIA_TYPE:
+            assert result['body'] == direct.json()
+        else:
+            assert base64.b64decode(result['body']) == direct.content
+
+def test_batch_reports_errors_per_entry(client, monkeypatch):
+    async def broken(*args):
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(main, "fetch_products", broken)
+
+    batch = client.post("/batch", json={'queries': [
+        {'path': '/sales/day', 'params': {'start_date': '2024-13-01'}},
+        {'path': '/sales/nope'},
+        {'path': '/metrics'},
+        {'path': '/sales/product'},
+        {'path': '/sales/filter_values'},
+    ]})
+
+    assert batch.status_code == 200
+    results = batch.json()['results']
+    assert [result['status'] for result in results] == [400, 404, 404, 500, 200]
+    assert results[3]['body'] == {'detail': 'Internal Server Error'}
+    assert 'Widget' in results[4]['body']['categories']
+
+@pytest.mark.parametrize("size", [0, main.MAX_BATCH_QUERIES + 1])
+def test_batch_rejects_empty_and_oversized_batches(client, size):
+    assert client.post("/batch", json={'queries': [{'path': '/sales/category'}] * size}).status_code == 400
+
+def test_batch_reads_one_snapshot_across_a_refresh(client, db_file, monkeypatch):
+    generation = client.get("/generation").json()['generation']
+    total = client.get("/sales/day/total").json()['total_sales']
+    days = client.get("/sales/day").json()
+    main.response_cache.clear()
+    fetch_sales_total = main.fetch_sales_total
+
+    async def refresh_then_fetch(*args):
+        # A data_cleaning refresh commits while the batch is being answered
+        with sqlite3.connect(db_file) as conn:
+            conn.execute("UPDATE daily_sales SET total_sales = total_sales * 2, cumulative_sales = cumulative_sales * 2")
+            conn.execute("UPDATE refresh_state SET value = 'refreshed' WHERE key = 'generation'")
+        return await fetch_sales_total(*args)
+    monkeypatch.setattr(main, "fetch_sales_total", refresh_then_fetch)
+
+    batch = client.post("/batch", json={'queries': [{'path': '/sales/day/total'}, {'path': '/sales/day'}]}).json()
+
+    assert batch['generation'] == generation
+    assert batch['results'][0]['body']['total_sales'] == total
+    assert batch['results'][1]['body'] == days
+    monkeypatch.setattr(main, "fetch_sales_total", fetch_sales_total)
+    assert client.get("/generation").json()['generation'] == 'refreshed'
+    assert client.get("/sales/day/total").json()['total_sales'] == pytest.approx(2 * total)
+
+def test_batch_ignores_a_parquet_copy_of_a_newer_generation(client, db_file, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow.dataset")
+    parquet_dir = tmp_path / "parquet"
+    monkeypatch.setattr(columnar, "ANALYTICS_STORE", "parquet")
+    monkeypatch.setattr(columnar, "PARQUET_DIR", str(parquet_dir))
+    export_parquet(str(db_file), str(parquet_dir))
+    expected = client.get("/sales/product").json()
+    main.response_cache.clear()
+    fetch_products = main.fetch_products
+
+    async def refresh_then_fetch(*args):
+        # The refresh doubles every sale and re-exports the copy under its new generation
+        with sqlite3.connect(db_file) as conn:
+            conn.execute("UPDATE sales SET total_sales = total_sales * 2")
+            conn.execute("UPDATE refresh_state SET value = 'refreshed' WHERE key = 'generation'")
+        export_parquet(str(db_file), str(parquet_dir))
+        return await fetch_products(*args)
+    monkeypatch.setattr(main, "fetch_products", refresh_then_fetch)
+
+    batch = client.post("/batch", json={'queries': [{'path': '/sales/product'}]}).json()
+
+    # The batch falls back to the SQL rollups, whose sums may differ in the last bits
+    body = batch['results'][0]['body']
+    assert [row['product'] for row in body] == [row['product'] for row in expected]
+    assert [row['total_sales'] for row in body] == pytest.approx([row['total_sales'] for row in expected])
+    monkeypatch.setattr(main, "fetch_products", fetch_products)
+    refreshed = client.get("/sales/product").json()
+    assert [row['total_sales'] for row in refreshed] == pytest.approx([2 * row['total_sales'] for row in expected])
+
+def test_more_concurrent_batches_than_pooled_connections(db_file, monkeypatch):
+    # Sub-queries that cannot get an executor slot give up quickly instead of after 5s
+    monkeypatch.setattr(database.get_executor(), "queue_timeout", 1.0)
+    batches = 2 * database.POOL_SIZE + 1
+
+    async def run_batches():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            async def batch(number):
+                # Distinct pages, so every sub-query reads the database
+                queries = [{'path': '/sales/outliers', 'params': {'limit': 2, 'offset': 5 * number + page}}
+                           for page in range(5)]
+                return await client.post("/batch", json={'queries': queries})
+            return await asyncio.gather(*(batch(number) for number in range(batches)))
+
+    responses = asyncio.run(run_batches())
+
+    assert [response.status_code for response in responses] == [200] * batches
+    assert all(result['status'] == 200 for response in responses for result in response.json()['results'])
@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+import columnar
+import main
+import memory_store
+from data_cleaning.DataCleaningSetUp import export_parquet
+from .test_memory_store import assert_same_rows
+
+pytest.importorskip("pyarrow.dataset")
+
+@pytest.fixture
+def parquet_dir(db_file, tmp_path):
+    """The Parquet copy of the test database."""
+    parquet_dir = tmp_path / "parquet"
+    export_parquet(str(db_file), str(parquet_dir))
+    return parquet_dir
+
+def get(client, monkeypatch, parquet_dir, store, path, params):
+    """A response of `path` computed by `store` ("parquet", "memory" or "sqlite"), bypassing the response cache."""
+    monkeypatch.setattr(columnar, "ANALYTICS_STORE", "parquet" if store == "parquet" else "sqlite")
+    monkeypatch.setattr(columnar, "PARQUET_DIR", str(parquet_dir))
+    monkeypatch.setattr(memory_store, "ANALYTICS_STORE", "memory" if store == "memory" else "sqlite")
+    main.response_cache.clear()
+    response = client.get(path, params=params)
+    assert response.status_code == 200
+    assert ("scan;" in response.headers['server-timing']) == (store == "parquet")
+    return response.json()
+
+@pytest.mark.parametrize("params", [
+    {},
+    {'category': 'Widget'},
+    {'product': 'B'},
+    {'category': 'Gadget', 'product': 'C'},
+    {'category': 'Zeppelin'},
+    {'product': 'Z'},
+    {'category': 'Zeppelin', 'product': 'A'},
+])
+def test_product_sales_match_sql(client, monkeypatch, parquet_dir, params):
+    expected = get(client, monkeypatch, parquet_dir, "sqlite", "/sales/product", params)
+    actual = get(client, monkeypatch, parquet_dir, "parquet", "/sales/product", params)
+    assert_same_rows(actual, expected)
+
+@pytest.mark.parametrize("dates", [
+    {},
+    {'start_date': '2024-01-10'},
+    {'end_date': '2024-01-10'},
+    {'start_date': '2023-12-30', 'end_date': '2024-02-03'},
+    {'start_date': '2024-01-15', 'end_date': '2024-01-15'},
+    {'start_date': '2024-02-01', 'end_date': '2024-01-01'},
+    {'start_date': '2025-01-01'},
+])
+def test_daily_sales_match_sql(client, monkeypatch, parquet_dir, dates):
+    expected = get(client, monkeypatch, parquet_dir, "sqlite", "/sales/day", dates)
+    actual = get(client, monkeypatch, parquet_dir, "parquet", "/sales/day", dates)
+    assert_same_rows(actual, expected)
+
+def test_products_are_ordered_by_name_on_every_store(client, monkeypatch, db_file, tmp_path):
+    # A product added by a later refresh gets the next id although its name sorts before
+    # older ones, so id order and name order differ
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("INSERT INTO products (product_id, product) VALUES (4, 'AA')")
+        conn.execute("UPDATE sales SET product_id = 4 WHERE product_id = 1 AND transaction_id % 2 = 0")
+        conn.execute("DELETE FROM sales_by_product")
+        conn.execute("INSERT INTO sales_by_product (category_id, product_id, total_sales, row_count)"
+                     " SELECT category_id, product_id, sum(total_sales), count(*) FROM sales"
+                     " GROUP BY category_id, product_id")
+        conn.execute("UPDATE refresh_state SET value = 'renamed' WHERE key = 'generation'")
+    parquet_dir = tmp_path / "parquet"
+    export_parquet(str(db_file), str(parquet_dir))
+
+    expected = get(client, monkeypatch, parquet_dir, "sqlite", "/sales/product", {})
+    assert [row['product'] for row in expected] == [None, 'A', 'AA', 'B', 'C']
+    for store in ["memory", "parquet"]:
+        assert_same_rows(get(client, monkeypatch, parquet_dir, store, "/sales/product", {}), expected)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from downsampling import lttb
+
+@pytest.fixture
+def series():
+    """A noisy sine wave of 1000 points."""
+    rng = np.random.default_rng(0)
+    x = np.arange(1000, dtype=float)
+    return x, np.sin(x / 50) + rng.normal(0, 0.1, len(x))
+
+@pytest.mark.parametrize("threshold", [3, 10, 257, 999])
+def test_lttb_keeps_exactly_threshold_points(series, threshold):
+    x, y = series
+    kept = lttb(x, y, threshold)
+
+    assert len(kept) == threshold
+    assert kept == sorted(set(kept))
+
+@pytest.mark.parametrize("threshold", [3, 64, 500])
+def test_lttb_keeps_first_and_last_points(series, threshold):
+    x, y = series
+    kept = lttb(x, y, threshold)
+
+    assert kept[0] == 0
+    assert kept[-1] == len(x) - 1
+
+@pytest.mark.parametrize("threshold", [1000, 5000, 2, 0])
+def test_lttb_returns_short_series_and_small_thresholds_whole(series, threshold):
+    x, y = series
+    assert lttb(x, y, threshold) == list(range(len(x)))
+
+def test_lttb_preserves_a_single_spike():
+    x = np.arange(500, dtype=float)
+    y = np.zeros(500)
+    y[321] = 100.0
+
+    assert 321 in lttb(x, y, 20)
@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+
+import main
+import memory_store
+from dates import to_date_key
+
+def get(client, monkeypatch, store, path, params):
+    """A response of `path` computed by `store` ("memory" or "sqlite"), bypassing the response cache."""
+    monkeypatch.setattr(memory_store, "ANALYTICS_STORE", store)
+    main.response_cache.clear()
+    response = client.get(path, params=params)
+    assert response.status_code == 200
+    assert ("memory;" in response.headers['server-timing']) == (store == "memory")
+    return response.json()
+
+def assert_same_rows(actual, expected):
+    """Rows equal up to float rounding, in the same order."""
+    assert len(actual) == len(expected)
+    for actual_row, expected_row in zip(actual, expected):
+        assert actual_row.keys() == expected_row.keys()
+        for name, value in expected_row.items():
+            if isinstance(value, float):
+                assert actual_row[name] == pytest.approx(value, rel=1e-12)
+            else:
+                assert actual_row[name] == value
+
+@pytest.mark.parametrize("params", [
+    {},
+    {'category': 'Widget'},
+    {'product': 'B'},
+    {'category': 'Gadget', 'product': 'C'},
+    {'category': 'Zeppelin'},
+    {'product': 'Z'},
+    {'category': 'Zeppelin', 'product': 'A'},
+])
+def test_product_sales_match_sql(client, monkeypatch, params):
+    expected = get(client, monkeypatch, "sqlite", "/sales/product", params)
+    actual = get(client, monkeypatch, "memory", "/sales/product", params)
+    assert_same_rows(actual, expected)
+
+@pytest.mark.parametrize("bucket", ["day", "week", "month"])
+@pytest.mark.parametrize("dates", [
+    {},
+    {'start_date': '2024-01-10'},
+    {'end_date': '2024-01-10'},
+    {'start_date': '2023-12-30', 'end_date': '2024-02-03'},
+    # The end date is inclusive, so a single day is a one-day range
+    {'start_date': '2024-01-15', 'end_date': '2024-01-15'},
+    # Empty ranges: reversed bounds and dates without sales
+    {'start_date': '2024-02-01', 'end_date': '2024-01-01'},
+    {'start_date': '2025-01-01'},
+    {'end_date': '2020-01-01'},
+])
+def test_daily_sales_match_sql(client, monkeypatch, bucket, dates):
+    params = {**dates, 'bucket': bucket}
+    expected = get(client, monkeypatch, "sqlite", "/sales/day", params)
+    actual = get(client, monkeypatch, "memory", "/sales/day", params)
+    assert_same_rows(actual, expected)
+
+def test_downsampled_daily_sales_match_sql(client, monkeypatch):
+    params = {'points': 20}
+    expected = get(client, monkeypatch, "sqlite", "/sales/day", params)
+    actual = get(client, monkeypatch, "memory", "/sales/day", params)
+    assert len(actual) == 20
+    assert_same_rows(actual, expected)
+
+def test_sales_columns_end_key_is_inclusive(db_file):
+    columns = memory_store.load_sales_columns(str(db_file))
+    with sqlite3.connect(db_file) as conn:
+        (total,) = conn.execute("SELECT total_sales FROM daily_sales WHERE date_key = ?",
+                                (to_date_key('2024-01-15'),)).fetchone()
+
+    day = to_date_key('2024-01-15')
+    _, rows = columns.daily_sales(day, day)
+    assert [(row[1], row[2]) for row in rows] == [('2024-01-15', day)]
+    assert rows[0][0] == pytest.approx(total)
+    assert columns.daily_sales(day + 1, day) == (["total_sales", "date", "x"], [])
+
+def test_memory_store_reloads_on_a_new_generation(client, db_file, monkeypatch):
+    before = get(client, monkeypatch, "memory", "/sales/product", {'category': 'Widget'})
+
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("UPDATE sales SET total_sales = total_sales * 2")
+        conn.execute("UPDATE sales_by_product SET total_sales = total_sales * 2")
+        conn.execute("UPDATE refresh_state SET value = 'refreshed' WHERE key = 'generation'")
+
+    after = get(client, monkeypatch, "memory", "/sales/product", {'category': 'Widget'})
+    assert memory_store.get_memory_store().load().generation == 'refreshed'
+    assert_same_rows(after, [{**row, 'total_sales': 2 * row['total_sales']} for row in before])
+    assert_same_rows(after, get(client, monkeypatch, "sqlite", "/sales/product", {'category': 'Widget'}))
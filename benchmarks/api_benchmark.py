@@ -0,0 +1,165 @@
+"""Latency (p50/p99) and throughput of every backend endpoint, served in-process over ASGI.
+
+The API runs against a database built from synthetic data, both with the response cache
+disabled (every request reaches SQLite) and enabled (repeat requests are cache hits).
+With --url, a running deployment is measured instead, e.g. to compare throughput across
+worker counts; its categories and products must match --categories and
+--products-per-category.
+
+Usage: python benchmarks/api_benchmark.py --rows 1000000 --output api.json
+       python benchmarks/api_benchmark.py --url http://localhost:8000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+# The backend modules import each other as top-level modules
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from benchmarks.report import latency_summary, write_report  # noqa: E402
+from benchmarks.schema_benchmark import synthetic_sales  # noqa: E402
+from data_cleaning.DataCleaningSetUp import aggregate, clean_data, create_database, process_outliers  # noqa: E402
+
+
+def endpoints(categories, products_per_category):
+    """
+    (name, method, path, params) of each endpoint, with filters that hit populated data.
+    GET params go in the query string, POST params are the JSON body.
+    """
+    category = f"Category-{categories // 2}"
+    product = f"{category}-Product-{products_per_category // 2}"
+    outliers_page = {"limit": 100, "sort_by": "total_sales", "descending": "true"}
+    return [
+        ("health", "GET", "/health", {}),
+        ("filter_values", "GET", "/sales/filter_values", {}),
+        ("product_all", "GET", "/sales/product", {}),
+        ("product_by_category", "GET", "/sales/product", {"category": category}),
+        ("product_by_product", "GET", "/sales/product", {"product": product}),
+        ("day_all", "GET", "/sales/day", {}),
+        ("day_range", "GET", "/sales/day", {"start_date": "2023-03-01", "end_date": "2023-03-31"}),
+        ("day_total", "GET", "/sales/day/total", {"start_date": "2022-06-01", "end_date": "2023-06-01"}),
+        ("category_stats", "GET", "/sales/category", {}),
+        ("outliers_all", "GET", "/sales/outliers", {}),
+        ("outliers_page", "GET", "/sales/outliers", outliers_page),
+        ("outliers_filtered", "GET", "/sales/outliers", {"limit": 100, "filter": f"category:eq:{category}"}),
+        # The dashboard's initial load as one request
+        ("batch_dashboard", "POST", "/batch", {"queries": [
+            {"path": "/sales/product", "params": {}},
+            {"path": "/sales/day", "params": {}},
+            {"path": "/sales/category", "params": {}},
+            {"path": "/sales/outliers", "params": outliers_page},
+        ]}),
+    ]
+
+
+def build_database(db_file, args):
+    df = clean_data(synthetic_sales(args.rows, args.categories, args.products_per_category, seed=args.seed))
+    aggregates = aggregate(df)
+    df_cleaned, df_outliers = process_outliers(df, aggregates["stats"])
+    create_database(df_cleaned, df_outliers, aggregates["category_day"], aggregates["category_mean"],
+                    aggregates["category_revenue"], db_file, aggregates)
+
+
+async def measure(client, method, path, params, requests, concurrency):
+    """Latency of `requests` sequential requests, then throughput with `concurrency` in flight."""
+    def send():
+        if method == "POST":
+            return client.post(path, json=params)
+        return client.get(path, params=params)
+
+    response = await send()  # warm the pool and the page cache
+    response.raise_for_status()
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await send()
+        samples.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+
+    async def worker(count):
+        for _ in range(count):
+            (await send()).raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    summary = latency_summary(samples)
+    summary["response_bytes"] = len(response.content)
+    summary["concurrency"] = concurrency
+    summary["requests_per_second"] = round(concurrency * (requests // concurrency) / elapsed, 1)
+    return summary
+
+
+async def run(args, db_file):
+    import cache
+    import database
+    import main as api
+
+    database.DATABASE_PATH = db_file
+    transport = httpx.ASGITransport(app=api.app)
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for mode in ["off", "on"]:
+                api.response_cache.clear()
+                # With no room for entries every lookup misses and the query runs
+                api.response_cache.max_entries = 0 if mode == "off" else cache.CACHE_MAX_ENTRIES
+                results[f"cache_{mode}"] = {
+                    name: await measure(client, method, path, params, args.requests, args.concurrency)
+                    for name, method, path, params in endpoints(args.categories, args.products_per_category)
+                }
+            results["stats"] = (await client.get("/stats")).json()
+    finally:
+        database.shutdown_executor()
+        database.close_pool()
+    return results
+
+
+async def run_remote(args):
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        results["remote"] = {
+            name: await measure(client, method, path, params, args.requests, args.concurrency)
+            for name, method, path, params in endpoints(args.categories, args.products_per_category)
+        }
+        # Each request lands on one worker, so these are the statistics of just one of them
+        results["stats"] = (await client.get("/stats")).json()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products-per-category", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and cache mode")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", default=None, help="Benchmark an existing database instead of a synthetic one")
+    parser.add_argument("--url", default=None, help="Benchmark a running backend at this URL")
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.url:
+        results = asyncio.run(run_remote(args))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = args.db
+            if db_file is None:
+                db_file = os.path.join(tmp, "data.db")
+                build_database(db_file, args)
+            results = asyncio.run(run(args, db_file))
+
+    write_report("api", {key: value for key, value in vars(args).items() if key != "output"}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
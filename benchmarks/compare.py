@@ -0,0 +1,64 @@
+"""Compare two JSON benchmark reports and flag regressions.
+
+Every timing (`seconds`, `*_ms`) and throughput (`*_per_second`) found in both reports is
+compared; a metric regresses when it is worse than the baseline by more than `--tolerance`.
+Exits with status 1 when any metric regressed.
+
+Usage: python benchmarks/compare.py baseline.json current.json --tolerance 0.1
+"""
+import argparse
+import json
+import sys
+
+
+def metrics(node, path=()):
+    """Yield (path, value) for every numeric timing or throughput leaf of a report."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from metrics(value, path + (key,))
+    elif isinstance(node, (int, float)) and not isinstance(node, bool) and path:
+        name = path[-1]
+        if name == "seconds" or name.endswith("_ms") or name.endswith("_per_second"):
+            yield path, node
+
+
+def compare(baseline, current, tolerance):
+    """Relative change of every shared metric; positive changes are improvements."""
+    before = dict(metrics(baseline["results"]))
+    rows = []
+    for path, value in metrics(current["results"]):
+        if path not in before or not before[path]:
+            continue
+        change = (value - before[path]) / before[path]
+        if not path[-1].endswith("_per_second"):
+            change = -change  # lower latency is better
+        rows.append((".".join(path), before[path], value, change, change < -tolerance))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative slowdown accepted before a metric counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline.get("benchmark") != current.get("benchmark"):
+        sys.exit(f"Cannot compare a {baseline.get('benchmark')} report with a {current.get('benchmark')} report")
+
+    rows = compare(baseline, current, args.tolerance)
+    width = max((len(row[0]) for row in rows), default=0)
+    for name, before, after, change, regressed in rows:
+        print(f"{name:<{width}}  {before:>12g}  {after:>12g}  {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+    regressions = sum(row[4] for row in rows)
+    print(f"{len(rows)} metrics compared, {regressions} regressed beyond {args.tolerance:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Full-history aggregation latency: SQLite (raw rows and rollups) vs an Arrow scan of the Parquet copy.
+
+Usage: python benchmarks/parquet_benchmark.py --rows 10000000 --output parquet.json
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow.fs import LocalFileSystem
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.report import write_report  # noqa: E402
+from benchmarks.schema_benchmark import synthetic_sales  # noqa: E402
+from data_cleaning.DataCleaningSetUp import (  # noqa: E402
+    aggregate,
+    clean_data,
+    create_database,
+    export_parquet,
+    process_outliers,
+)
+
+SQLITE_QUERIES = {
+    "daily_total_raw": "SELECT date_key, sum(total_sales) FROM sales GROUP BY date_key",
+    "daily_total_rollup": "SELECT date_key, total_sales FROM daily_sales",
+    "category_products_raw": (
+        "SELECT product_id, sum(total_sales) FROM sales"
+        " WHERE category_id = (SELECT category_id FROM categories WHERE category = 'Category-3')"
+        " GROUP BY product_id"
+    ),
+}
+
+
+def arrow_queries(dataset):
+    return {
+        "daily_total_scan": lambda: dataset.to_table(columns=["date", "total_sales"])
+        .group_by("date").aggregate([("total_sales", "sum")]),
+        "category_products_scan": lambda: dataset.to_table(
+            columns=["product", "total_sales"], filter=ds.field("category") == "Category-3"
+        ).group_by("product").aggregate([("total_sales", "sum")]),
+    }
+
+
+def median_ms(run, repeat):
+    run()  # warm the page cache
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def directory_mb(path):
+    return round(sum(os.path.getsize(os.path.join(root, name))
+                     for root, _, names in os.walk(path) for name in names) / 2 ** 20, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    df = clean_data(synthetic_sales(args.rows))
+    aggregates = aggregate(df)
+    df_cleaned, df_outliers = process_outliers(df, aggregates["stats"])
+    del df
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "data.db")
+        parquet_dir = os.path.join(tmp, "parquet")
+        create_database(df_cleaned, df_outliers, aggregates["category_day"], aggregates["category_mean"],
+                        aggregates["category_revenue"], db_file, aggregates)
+        del df_cleaned, df_outliers
+        start = time.perf_counter()
+        export_parquet(db_file, parquet_dir)
+        export_seconds = time.perf_counter() - start
+
+        dataset = ds.dataset(
+            os.path.join(parquet_dir, "sales"),
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([("year", pa.string()), ("category", pa.string())]),
+                                         flavor="hive"),
+            filesystem=LocalFileSystem(use_mmap=True),
+        )
+        conn = sqlite3.connect(db_file)
+        try:
+            sqlite_ms = {name: {"median_ms": median_ms(lambda: conn.execute(query).fetchall(), args.repeat)}
+                         for name, query in SQLITE_QUERIES.items()}
+        finally:
+            conn.close()
+        arrow_ms = {name: {"median_ms": median_ms(run, args.repeat)} for name, run in arrow_queries(dataset).items()}
+
+        results = {
+            "sqlite": sqlite_ms,
+            "arrow": arrow_ms,
+            "export": {"seconds": round(export_seconds, 2)},
+            "size_mb": {"sqlite": round(os.path.getsize(db_file) / 2 ** 20, 1), "parquet": directory_mb(parquet_dir)},
+        }
+    write_report("parquet", {key: value for key, value in vars(args).items() if key != "output"}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Wall time and throughput of each stage of DataCleaningSetUp on synthetic data, plus end-to-end runs.
+
+Usage: python benchmarks/pipeline_benchmark.py --rows 10000000 --output pipeline.json
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.report import write_report  # noqa: E402
+from benchmarks.schema_benchmark import synthetic_sales  # noqa: E402
+from data_cleaning.DataCleaningSetUp import (  # noqa: E402
+    aggregate,
+    clean_data,
+    create_database,
+    export_parquet,
+    main as run_pipeline,
+    outlier_stats,
+    process_outliers,
+    read_csv,
+)
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+
+def timed(stages, name, rows, run):
+    """Run `run()`, record its wall time and row throughput under `name` and return its result."""
+    start = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - start
+    stages[name] = {"seconds": round(seconds, 3), "rows_per_second": round(rows / seconds) if seconds else None}
+    return result
+
+
+def time_stages(csv_path, db_file, parquet_dir, rows, outlier_method):
+    """Each step of the in-memory path of `main`, timed separately."""
+    stages = {}
+    df = timed(stages, "read_csv", rows, lambda: read_csv(csv_path))
+    df = timed(stages, "clean_data", rows, lambda: clean_data(df))
+    aggregates = timed(stages, "aggregate", rows, lambda: aggregate(df))
+    df_cleaned, df_outliers = timed(
+        stages, "process_outliers", rows,
+        lambda: process_outliers(df, outlier_stats(df, aggregates, outlier_method))
+    )
+    timed(stages, "create_database", rows, lambda: create_database(
+        df_cleaned, df_outliers, aggregates["category_day"], aggregates["category_mean"],
+        aggregates["category_revenue"], db_file, aggregates if outlier_method == "std" else None
+    ))
+    if pyarrow is not None:
+        timed(stages, "export_parquet", rows, lambda: export_parquet(db_file, parquet_dir))
+    return stages
+
+
+def time_modes(csv_path, tmp, rows, args):
+    """End-to-end `main` runs for each requested mode."""
+    options = {
+        "in_memory": {},
+        "chunked": {"chunksize": args.chunksize},
+        "parallel": {"workers": args.workers},
+    }
+    modes = {}
+    for mode in args.modes:
+        db_file = os.path.join(tmp, f"{mode}.db")
+        timed(modes, mode, rows, lambda: run_pipeline(csv_path, db_file, outlier_method=args.outlier_method,
+                                                      **options[mode]))
+    return modes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products-per-category", type=int, default=50)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--dirty", type=float, default=0.01,
+                        help="Fraction of rows with a blank quantity or an unparseable price")
+    parser.add_argument("--outlier-method", choices=["std", "mad"], default="std")
+    parser.add_argument("--modes", nargs="*", choices=["in_memory", "chunked", "parallel"], default=["in_memory"],
+                        help="End-to-end runs of main() to time in addition to the stages")
+    parser.add_argument("--chunksize", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "data.csv")
+        synthetic_sales(args.rows, args.categories, args.products_per_category, args.days, args.seed,
+                        args.dirty).to_csv(csv_path, index=False)
+        csv_mb = round(os.path.getsize(csv_path) / 2 ** 20, 1)
+        stages = time_stages(csv_path, os.path.join(tmp, "data.db"), os.path.join(tmp, "parquet"),
+                             args.rows, args.outlier_method)
+        modes = time_modes(csv_path, tmp, args.rows, args)
+
+    write_report("pipeline", {key: value for key, value in vars(args).items() if key != "output"}, {
+        "csv_mb": csv_mb,
+        "stages": stages,
+        "total_stage_seconds": round(sum(stage["seconds"] for stage in stages.values()), 3),
+        "modes": modes,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
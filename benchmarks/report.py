@@ -0,0 +1,57 @@
+"""Helpers shared by the benchmark scripts for summarizing timings and writing JSON reports."""
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+REPORT_VERSION = 1
+
+
+def latency_summary(samples_ms, elapsed_seconds=None):
+    """p50/p99/max latency of a list of millisecond samples, and throughput when `elapsed_seconds` is given."""
+    samples = np.asarray(samples_ms, dtype=float)
+    summary = {
+        "count": int(len(samples)),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "max_ms": round(float(samples.max()), 3),
+    }
+    if elapsed_seconds:
+        summary["requests_per_second"] = round(len(samples) / elapsed_seconds, 1)
+    return summary
+
+
+def environment():
+    """Where a report was produced, so runs on different machines or commits are not mixed up."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_report(name, parameters, results, output=None):
+    """Print the report as JSON and, with `output`, also write it to that file."""
+    report = {
+        "benchmark": name,
+        "version": REPORT_VERSION,
+        "environment": environment(),
+        "parameters": parameters,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return report
@@ -0,0 +1,154 @@
+"""Query latency of the API filter paths on the legacy `to_sql` schema vs the typed schema.
+
+Usage: python benchmarks/schema_benchmark.py --rows 10000000 --output schema.json
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.report import write_report  # noqa: E402
+from data_cleaning.DataCleaningSetUp import (  # noqa: E402
+    calculate_category_day,
+    calculate_category_mean,
+    calculate_category_revenue,
+    clean_data,
+    create_database,
+    process_outliers,
+)
+
+LEGACY_QUERIES = {
+    "product_all": ("SELECT sum(total_sales) as total_sales, product FROM sales GROUP BY product", {}),
+    "product_by_category": (
+        "SELECT sum(total_sales) as total_sales, product FROM sales WHERE category = :category GROUP BY product",
+        {"category": "Category-3"},
+    ),
+    "product_by_product": (
+        "SELECT sum(total_sales) as total_sales, product FROM sales WHERE product = :product GROUP BY product",
+        {"product": "Category-3-Product-7"},
+    ),
+    "day_range": (
+        "SELECT sum(total_sales) as total_sales, date FROM sales"
+        " WHERE date BETWEEN :start_date AND :end_date GROUP BY date",
+        {"start_date": "2023-03-01", "end_date": "2023-03-31"},
+    ),
+}
+
+TYPED_QUERIES = {
+    "product_all": (
+        "SELECT t.total_sales, p.product FROM (SELECT sum(total_sales) as total_sales, product_id FROM sales"
+        " GROUP BY product_id) t LEFT JOIN products p ON p.product_id = t.product_id",
+        {},
+    ),
+    "product_by_category": (
+        "SELECT t.total_sales, p.product FROM (SELECT sum(total_sales) as total_sales, product_id FROM sales"
+        " WHERE category_id = (SELECT category_id FROM categories WHERE category = :category)"
+        " GROUP BY product_id) t LEFT JOIN products p ON p.product_id = t.product_id",
+        {"category": "Category-3"},
+    ),
+    "product_by_product": (
+        "SELECT t.total_sales, p.product FROM (SELECT sum(total_sales) as total_sales, product_id FROM sales"
+        " WHERE product_id = (SELECT product_id FROM products WHERE product = :product)"
+        " GROUP BY product_id) t LEFT JOIN products p ON p.product_id = t.product_id",
+        {"product": "Category-3-Product-7"},
+    ),
+    "day_range": (
+        "SELECT sum(total_sales) as total_sales, date(date_key * 86400, 'unixepoch') as date FROM sales"
+        " WHERE date_key BETWEEN :start_key AND :end_key GROUP BY date_key",
+        {"start_key": 19417, "end_key": 19447},
+    ),
+}
+
+
+def synthetic_sales(rows, categories=20, products_per_category=50, days=3 * 365, seed=0, dirty=0.0):
+    """Raw rows shaped like data.csv, with categorical names to keep 10M rows in memory.
+
+    With `dirty` > 0, that fraction of quantities is blanked and of prices replaced by
+    'not_a_number' or a blank, like the defects `clean_data` repairs.
+    """
+    rng = np.random.default_rng(seed)
+    category = rng.integers(0, categories, rows)
+    product = category * products_per_category + rng.integers(0, products_per_category, rows)
+    category_names = [f"Category-{c}" for c in range(categories)]
+    product_names = [f"Category-{c}-Product-{p}" for c in range(categories) for p in range(products_per_category)]
+    df = pd.DataFrame({
+        "transaction_id": np.arange(1, rows + 1),
+        "date": np.datetime64("2022-01-01") + rng.integers(0, days, rows).astype("timedelta64[D]"),
+        "category": pd.Categorical.from_codes(category, category_names),
+        "product": pd.Categorical.from_codes(product, product_names),
+        "quantity": rng.poisson(5, rows).astype(float),
+        "price": rng.uniform(1, 100, rows).round(2),
+    })
+    if dirty:
+        df.loc[rng.random(rows) < dirty, "quantity"] = np.nan
+        bad_price = rng.random(rows) < dirty
+        df["price"] = df["price"].astype(object)
+        df.loc[bad_price, "price"] = np.where(rng.random(bad_price.sum()) < 0.5, "not_a_number", None)
+    return df
+
+
+def build_legacy(df, df_outliers, db_file):
+    """The schema create_database produced before: plain `to_sql` tables, no indexes."""
+    conn = sqlite3.connect(db_file)
+    try:
+        df.to_sql("sales", conn, if_exists="replace", index=False, chunksize=100_000)
+        df_outliers.to_sql("outliers", conn, if_exists="replace", index=False, chunksize=100_000)
+    finally:
+        conn.close()
+
+
+def time_queries(db_file, queries, repeat):
+    conn = sqlite3.connect(db_file)
+    results = {}
+    try:
+        for name, (query, params) in queries.items():
+            conn.execute(query, params).fetchall()  # warm the page cache
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(query, params).fetchall()
+                samples.append((time.perf_counter() - start) * 1000)
+            results[name] = {"median_ms": round(statistics.median(samples), 3)}
+    finally:
+        conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    df = clean_data(synthetic_sales(args.rows))
+    df_cleaned, df_outliers = process_outliers(df)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, "legacy.db")
+        typed_db = os.path.join(tmp, "typed.db")
+        build_legacy(df_cleaned, df_outliers, legacy_db)
+        create_database(df_cleaned, df_outliers, calculate_category_day(df), calculate_category_mean(df),
+                        calculate_category_revenue(df), typed_db)
+
+        results = {
+            "legacy": time_queries(legacy_db, LEGACY_QUERIES, args.repeat),
+            "typed": time_queries(typed_db, TYPED_QUERIES, args.repeat),
+            "file_mb": {
+                "legacy": round(os.path.getsize(legacy_db) / 2 ** 20, 1),
+                "typed": round(os.path.getsize(typed_db) / 2 ** 20, 1),
+            },
+        }
+    write_report("schema", {key: value for key, value in vars(args).items() if key != "output"}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
+import argparse
+import os
+from itertools import repeat
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 import sqlite3
+import uuid
+import numpy as np
 import pandas as pd
 
-def clean_data(df):
-    # Basic Cleaning
-    df['price'] = pd.to_numeric(df['price'], errors='coerce')
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # only needed for the optional Parquet export
+    pa = ds = None
+
+def coerce_numeric(df):
+    """Convert quantity and price to floats and drop rows where both are missing."""
+    df['price'] = pd.to_numeric(df['price'], errors='coerce').astype('float64')
+    df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce').astype('float64')
     df = df.dropna(subset=['quantity', 'price'], how='all')
     df['quantity'] = df['quantity'].fillna(0)
+    return df
+
+def clean_data(df, medians=None):
+    # Basic Cleaning
+    df = coerce_numeric(df)
 
-    medians = df.groupby("category")['price'].median()
+    if medians is None:
+        medians = df.groupby("category", observed=True)['price'].median()
     df['price'] = df['price'].fillna(medians).fillna(0)
 
     df['total_sales'] = df['quantity'] * df['price']
@@ -19,56 +39,1043 @@ def clean_data(df):
 
 def calculate_category_mean(df):
     """Calculate mean price for each category-product combination."""
-    return df.groupby(["category", "product"])['price'].mean()
+    return df.groupby(["category", "product"], observed=True)['price'].mean()
 
 def calculate_category_revenue(df):
     """Calculate total revenue for each category."""
-    return df.groupby("category")['total_sales'].sum()
+    return df.groupby("category", observed=True)['total_sales'].sum()
 
 def calculate_category_day(df):
     """Identify the day with the highest sales for each category."""
-    category_day = df.groupby(['category', 'date'])['total_sales'].sum().reset_index()
-    idx = category_day.groupby('category')['total_sales'].transform('max') == category_day['total_sales']
+    return max_category_day(df.groupby(['category', 'date'], observed=True)['total_sales'].sum())
+
+def max_category_day(totals):
+    """Pick the highest-selling date per category from a (category, date) -> total_sales Series."""
+    category_day = totals.reset_index()
+    idx = category_day.groupby('category', observed=True)['total_sales'].transform('max') == category_day['total_sales']
     return category_day[idx]
 
-def process_outliers(df):
-    """Detect transactions where quantity is more than 2 standard deviations from the category mean."""
-    stats = df.groupby("category")['quantity'].agg(['mean', 'std']).reset_index()
-    df = df.merge(stats, on="category")
-    df['outlier'] = ((df['quantity'] < df['mean'] - 2 * df['std']) |
-                     (df['quantity'] > df['mean'] + 2 * df['std']))
-    df_outliers = df[df['outlier']].drop(columns=['mean', 'std', 'outlier'])
-    df_cleaned = df[~df['outlier']].drop(columns=['mean', 'std', 'outlier'])
+# Outlier detection
+#
+# A transaction is an outlier when its quantity lies more than `threshold` scales from the
+# center of its category. The 'std' method uses the mean and standard deviation; 'mad' uses
+# the median and the median absolute deviation, scaled to match the standard deviation of
+# normal data, so the same threshold means roughly the same band for both.
+
+OUTLIER_METHODS = ['std', 'mad']
+OUTLIER_THRESHOLD = 2.0
+MAD_SCALE = 1.4826
+
+def outlier_bounds(stats, threshold=OUTLIER_THRESHOLD):
+    """Per-category `lower` and `upper` quantity bounds.
+
+    `stats` has `mean` and `std` columns for the 'std' method or `median` and `mad` for 'mad'.
+    """
+    if 'median' in stats:
+        center, scale = stats['median'], MAD_SCALE * stats['mad']
+    else:
+        center, scale = stats['mean'], stats['std']
+    return pd.DataFrame({'lower': center - threshold * scale, 'upper': center + threshold * scale})
+
+def outlier_stats(df, aggregates, method='std'):
+    """The `process_outliers` statistics of `method` for a cleaned frame and its `aggregate` output."""
+    if method == 'std':
+        return aggregates['stats']
+    if method == 'mad':
+        return sketch_to_stats(quantity_sketch(df, accuracy=0))
+    raise ValueError(f"Unknown outlier method {method!r}, expected one of {OUTLIER_METHODS}")
+
+def take_by_code(values, codes):
+    """Look up `values` per categorical code; code -1 (missing) picks a trailing NaN."""
+    return np.append(values, np.nan).astype(values.dtype)[codes]
+
+def process_outliers(df, stats=None, threshold=OUTLIER_THRESHOLD):
+    """Detect transactions where quantity is more than `threshold` scales from the category center.
+
+    `stats` is an optional per-category frame accepted by `outlier_bounds`; when omitted the
+    mean and standard deviation are computed from `df`.
+    """
+    if stats is None:
+        stats = df.groupby("category", observed=True)['quantity'].agg(['mean', 'std'])
+    bounds = outlier_bounds(stats, threshold)
+    # Broadcast the bounds through category codes instead of merging them onto every row.
+    # Rows whose category has no statistics are dropped, as the inner merge used to do.
+    codes = pd.Categorical(df['category'], categories=decode_categories(bounds.index)).codes
+    known = codes >= 0
+    lower = take_by_code(bounds['lower'].to_numpy(), codes)
+    upper = take_by_code(bounds['upper'].to_numpy(), codes)
+    quantity = df['quantity'].to_numpy()
+    outlier = known & ((quantity < lower) | (quantity > upper))
+    cleaned = known & ~outlier
+    # Number the kept rows 0..n-1 like the merged frame did
+    labels = np.cumsum(known) - 1
+    df_outliers = df[outlier].set_axis(labels[outlier])
+    df_cleaned = df[cleaned].set_axis(labels[cleaned])
     return df_cleaned, df_outliers
 
-def create_database(df, df_outliers, df_category_day, df_category_mean, df_category_revenue, db_file):
-    conn = sqlite3.connect(db_file)
+# Aggregation engine
+#
+# `aggregate` produces every per-category statistic the pipeline needs from a single
+# factorization of the category, product and date columns. Group sums are taken with
+# `np.bincount` over the integer codes, so the frame is never re-grouped or merged.
+
+def decode_categories(index):
+    """A categorical index as an index of its values; other indexes are returned as is."""
+    if isinstance(index, pd.CategoricalIndex):
+        return index.astype(index.categories.dtype)
+    return index
+
+def group_sums(codes, size, weights=None):
+    """Per-group row counts, or sums of `weights`; rows with a negative code are skipped."""
+    valid = codes >= 0
+    if not valid.all():
+        codes = codes[valid]
+        weights = None if weights is None else weights[valid]
+    return np.bincount(codes, weights, minlength=size)
+
+def pair_codes(outer, inner, inner_size):
+    """Codes and (outer, inner) code pairs, in sorted order, of the combined key."""
+    combined = np.where((outer >= 0) & (inner >= 0), outer * inner_size + inner, -1)
+    codes, uniques = pd.factorize(combined, sort=True, use_na_sentinel=False)
+    if len(uniques) and uniques[0] == -1:
+        codes, uniques = codes - 1, uniques[1:]
+    return codes, uniques // inner_size, uniques % inner_size
+
+def aggregate(df):
+    """All per-category statistics of a cleaned frame in one grouped pass.
+
+    Returns a dict with `category_mean`, `category_revenue` and `category_day` (the outputs of
+    the `calculate_*` functions), the per-(category, date) `day_totals`, the `stats` used by
+    `process_outliers` and the `moments`, `price_totals` and `watermark` of `summarize`.
+    """
+    category_codes, categories = pd.factorize(df['category'], sort=True)
+    product_codes, products = pd.factorize(df['product'], sort=True)
+    date_codes, dates = pd.factorize(df['date'], sort=True)
+    quantity = df['quantity'].to_numpy(dtype='float64')
+    total_sales = df['total_sales'].to_numpy(dtype='float64')
+    categories = decode_categories(pd.Index(categories, name='category'))
+    products = decode_categories(pd.Index(products, name='product'))
+
+    count = group_sums(category_codes, len(categories))
+    mean = group_sums(category_codes, len(categories), quantity) / count
+    # Two-pass variance, as pandas computes it
+    known = category_codes >= 0
+    deviation = quantity[known] - mean[category_codes[known]]
+    m2 = np.bincount(category_codes[known], deviation * deviation, minlength=len(categories))
+    moments = pd.DataFrame({'count': count, 'mean': mean, 'm2': m2}, index=categories)
+    revenue = group_sums(category_codes, len(categories), total_sales)
+
+    codes, pair_categories, pair_products = pair_codes(category_codes, product_codes, len(products))
+    price_count = group_sums(codes, len(pair_categories))
+    price_sum = group_sums(codes, len(pair_categories), df['price'].to_numpy(dtype='float64'))
+    pairs = pd.MultiIndex.from_arrays(
+        [categories[pair_categories], products[pair_products]], names=['category', 'product']
+    )
+    totals = pd.DataFrame({'price_sum': price_sum, 'price_count': price_count}, index=pairs)
+
+    codes, day_categories, day_dates = pair_codes(category_codes, date_codes, len(dates))
+    day_sales = group_sums(codes, len(day_categories), total_sales)
+    day_totals = pd.Series(
+        day_sales,
+        index=pd.MultiIndex.from_arrays([categories[day_categories], dates[day_dates]], names=['category', 'date']),
+        name='total_sales'
+    )
+
+    return {
+        'category_mean': (totals['price_sum'] / totals['price_count']).rename('price'),
+        'category_revenue': pd.Series(revenue, index=categories, name='total_sales'),
+        'category_day': max_category_day(day_totals),
+        'day_totals': day_totals,
+        'stats': moments_to_stats(moments),
+        'moments': moments,
+        'price_totals': totals,
+        'watermark': dates.max(),
+    }
+
+# Database schema
+#
+# `sales` and `outliers` store categories and products as ids into the `categories` and
+# `products` dictionaries and the date as a day number (days since 1970-01-01), so the
+# API filter paths are answered from covering indexes. `sales_view` and `outliers_view`
+# decode the rows back to the columns produced by `clean_data`.
+
+DATE_FORMAT = '%Y-%m-%d'
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+TRANSACTIONS_TABLE = """
+CREATE TABLE {table} (
+    transaction_id INTEGER,
+    date_key INTEGER NOT NULL,
+    category_id INTEGER REFERENCES categories (category_id),
+    product_id INTEGER REFERENCES products (product_id),
+    quantity REAL NOT NULL,
+    price REAL NOT NULL,
+    total_sales REAL NOT NULL,
+    day_of_week INTEGER NOT NULL,
+    high_volume INTEGER NOT NULL
+);
+CREATE VIEW {table}_view AS
+SELECT t.transaction_id,
+       date(t.date_key * 86400, 'unixepoch') AS date,
+       c.category,
+       p.product,
+       t.quantity,
+       t.price,
+       t.total_sales,
+       CASE t.day_of_week {day_names} END AS day_of_week,
+       t.high_volume
+FROM {table} t
+LEFT JOIN categories c ON c.category_id = t.category_id
+LEFT JOIN products p ON p.product_id = t.product_id;
+"""
+
+SCHEMA = """
+CREATE TABLE categories (category_id INTEGER PRIMARY KEY, category TEXT NOT NULL UNIQUE);
+CREATE TABLE products (product_id INTEGER PRIMARY KEY, product TEXT NOT NULL UNIQUE);
+CREATE TABLE category_day (category TEXT NOT NULL, date TEXT NOT NULL, total_sales REAL NOT NULL);
+CREATE TABLE category_mean (
+    category TEXT NOT NULL,
+    product TEXT NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (category, product)
+);
+CREATE TABLE category_revenue (category TEXT PRIMARY KEY, total_sales REAL NOT NULL);
+CREATE TABLE quantity_moments (
+    category TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL
+);
+CREATE TABLE price_totals (
+    category TEXT NOT NULL,
+    product TEXT NOT NULL,
+    price_sum REAL NOT NULL,
+    price_count INTEGER NOT NULL,
+    PRIMARY KEY (category, product)
+);
+CREATE TABLE refresh_state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE sales_by_product (
+    category_id INTEGER,
+    product_id INTEGER,
+    total_sales REAL NOT NULL,
+    row_count INTEGER NOT NULL
+);
+CREATE TABLE sales_by_day_product (
+    date_key INTEGER NOT NULL,
+    category_id INTEGER,
+    product_id INTEGER,
+    total_sales REAL NOT NULL,
+    row_count INTEGER NOT NULL
+);
+CREATE TABLE daily_sales (
+    date_key INTEGER PRIMARY KEY,
+    total_sales REAL NOT NULL,
+    cumulative_sales REAL NOT NULL,
+    row_count INTEGER NOT NULL
+);
+""" + "".join(
+    TRANSACTIONS_TABLE.format(
+        table=table,
+        day_names=" ".join(f"WHEN {number} THEN '{name}'" for number, name in enumerate(DAY_NAMES))
+    )
+    for table in ['sales', 'outliers']
+)
+
+# Built after the bulk load. The (category_id, product_id) index also serves
+# product-only filters through SQLite's skip-scan once ANALYZE has run.
+INDEXES = """
+CREATE INDEX idx_sales_category_product ON sales (category_id, product_id, total_sales);
+CREATE INDEX idx_sales_date ON sales (date_key, total_sales);
+CREATE INDEX idx_sales_category_quantity ON sales (category_id, quantity);
+CREATE INDEX idx_outliers_category_quantity ON outliers (category_id, quantity);
+"""
+
+# Rollups of `sales` that answer the API filter paths without touching the raw rows.
+# `daily_sales.cumulative_sales` is a prefix sum, so any date range total is the
+# difference of two rows. `row_count` is the number of `sales` rows behind each
+# rollup row; the incremental refresh drops rollup rows whose count reaches zero.
+ROLLUPS = """
+INSERT INTO sales_by_day_product (date_key, category_id, product_id, total_sales, row_count)
+SELECT date_key, category_id, product_id, sum(total_sales), count(*) FROM sales
+GROUP BY date_key, category_id, product_id;
+INSERT INTO sales_by_product (category_id, product_id, total_sales, row_count)
+SELECT category_id, product_id, sum(total_sales), sum(row_count) FROM sales_by_day_product
+GROUP BY category_id, product_id;
+INSERT INTO daily_sales (date_key, total_sales, cumulative_sales, row_count)
+SELECT date_key, total_sales, sum(total_sales) OVER (ORDER BY date_key), row_count
+FROM (SELECT date_key, sum(total_sales) AS total_sales, sum(row_count) AS row_count FROM sales_by_day_product
+      GROUP BY date_key);
+CREATE INDEX idx_sales_by_day_product ON sales_by_day_product (date_key, category_id, product_id);
+CREATE INDEX idx_sales_by_product ON sales_by_product (category_id, product_id);
+"""
+
+def create_schema(conn):
+    """Create the tables in an empty staging database tuned for bulk loading."""
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executescript(SCHEMA)
+
+def finalize_database(conn):
+    """Index the loaded tables, build the rollups, gather planner statistics and switch to WAL."""
+    conn.commit()
+    conn.executescript(INDEXES)
+    conn.executescript(ROLLUPS)
+    set_generation(conn)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA journal_mode = WAL")
+
+def set_generation(conn):
+    """Stamp the database with a new generation id so readers can invalidate caches."""
+    conn.execute("INSERT OR REPLACE INTO refresh_state (key, value) VALUES ('generation', ?)",
+                 (uuid.uuid4().hex,))
+
+def write_dictionaries(conn, categories, products):
+    """Add unseen category and product names to the dictionary tables, in sorted order."""
+    conn.executemany("INSERT OR IGNORE INTO categories (category) VALUES (?)",
+                     ((name,) for name in sorted(categories.dropna().unique())))
+    conn.executemany("INSERT OR IGNORE INTO products (product) VALUES (?)",
+                     ((name,) for name in sorted(products.dropna().unique())))
+
+def date_keys(dates):
+    """Days since 1970-01-01 for a datetime Series."""
+    return pd.Series(dates.to_numpy().astype('datetime64[D]').astype('int64'), index=dates.index)
+
+def encode_rows(conn, df):
+    """Convert cleaned rows to the column layout of the `sales` and `outliers` tables."""
+    categories = dict(conn.execute("SELECT category, category_id FROM categories"))
+    products = dict(conn.execute("SELECT product, product_id FROM products"))
+    return pd.DataFrame({
+        'transaction_id': df['transaction_id'] if 'transaction_id' in df else None,
+        'date_key': date_keys(df['date']),
+        'category_id': df['category'].map(categories).astype('Int64'),
+        'product_id': df['product'].map(products).astype('Int64'),
+        'quantity': df['quantity'],
+        'price': df['price'],
+        'total_sales': df['total_sales'],
+        'day_of_week': df['date'].dt.dayofweek,
+        'high_volume': df['high_volume'],
+    }, index=df.index)
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+INSERT_BATCH_SIZE = 100_000
+
+def insert_frame(conn, table, df):
+    """Insert the columns of `table` from `df`, formatting dates as `DATE_FORMAT`.
+
+    Rows are converted to Python objects one batch at a time to keep memory bounded.
+    """
+    columns = table_columns(conn, table)
+    quoted = ', '.join(f'"{column}"' for column in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    query = f'INSERT INTO "{table}" ({quoted}) VALUES ({placeholders})'
+    for start in range(0, len(df), INSERT_BATCH_SIZE):
+        rows = df.iloc[start:start + INSERT_BATCH_SIZE][columns]
+        for column in rows.select_dtypes('datetime').columns:
+            rows[column] = rows[column].dt.strftime(DATE_FORMAT)
+        rows = rows.astype(object).where(rows.notna(), None)
+        conn.executemany(query, rows.itertuples(index=False, name=None))
+
+def insert_rows(conn, table, df):
+    """Encode cleaned rows and append them to `sales` or `outliers`."""
+    insert_frame(conn, table, encode_rows(conn, df))
+
+def create_database(df, df_outliers, df_category_day, df_category_mean, df_category_revenue, db_file, summary=None,
+                    outlier_threshold=OUTLIER_THRESHOLD):
+    """Build all tables in a staging file and publish it over `db_file` atomically.
+
+    `summary` is the output of `summarize` or `aggregate`; when given, the state needed by
+    `refresh_database` is stored alongside the tables, including the `outlier_threshold`
+    the rows were split with.
+    """
+    staged_file = open_staging(db_file)
+    conn = sqlite3.connect(staged_file)
     try:
-        df.to_sql('sales', conn, if_exists='replace', index=False)
-        df_outliers.to_sql('outliers', conn, if_exists='replace', index=False)
-        df_category_day.to_sql('category_day', conn, if_exists='replace', index=False)
-        df_category_mean.to_sql('category_mean', conn, if_exists='replace')
-        df_category_revenue.to_sql('category_revenue', conn, if_exists='replace')
+        create_schema(conn)
+        write_dictionaries(conn,
+                           pd.concat([df['category'], df_outliers['category']]),
+                           pd.concat([df['product'], df_outliers['product']]))
+        insert_rows(conn, 'sales', df)
+        insert_rows(conn, 'outliers', df_outliers)
+        insert_frame(conn, 'category_day', df_category_day)
+        insert_frame(conn, 'category_mean', df_category_mean.reset_index())
+        insert_frame(conn, 'category_revenue', df_category_revenue.reset_index())
+        if summary is not None:
+            write_refresh_state(conn, summary, outlier_threshold)
+        finalize_database(conn)
     finally:
         conn.close()
+    publish_database(staged_file, db_file)
+
+def open_staging(db_file):
+    """Return a fresh staging path next to `db_file`, discarding leftovers of a failed run."""
+    staged_file = f"{db_file}.staging"
+    if os.path.exists(staged_file):
+        os.remove(staged_file)
+    return staged_file
+
+def publish_database(staged_file, db_file):
+    """Copy the staged database over `db_file` in a single transaction.
+
+    SQLite's backup API holds a write lock on the target for the whole copy, so readers
+    of `db_file` see either the previous snapshot or the new one, never a partial file.
+    """
+    source = sqlite3.connect(staged_file)
+    target = sqlite3.connect(db_file)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    os.remove(staged_file)
+
+# Streaming pipeline
+#
+# The helpers below let `main` process a CSV in fixed-size chunks. Every statistic the
+# in-memory path needs is kept as a mergeable partial (counts, sums, moments) so that
+# memory is bounded by the number of categories/products/dates, not by the row count.
+
+def quantity_moments(df):
+    """Per-category count, mean and sum of squared deviations (m2) of quantity."""
+    grouped = df.groupby("category", observed=True)['quantity']
+    moments = grouped.agg(['count', 'mean'])
+    moments['m2'] = grouped.var(ddof=0) * moments['count']
+    return moments
+
+def merge_moments(left, right):
+    """Combine two per-category moment frames (Chan et al. parallel update)."""
+    left, right = left.align(right, fill_value=0)
+    count = left['count'] + right['count']
+    delta = right['mean'] - left['mean']
+    safe_count = count.where(count > 0, 1)
+    return pd.DataFrame({
+        'count': count,
+        'mean': left['mean'] + delta * right['count'] / safe_count,
+        'm2': left['m2'] + right['m2'] + delta ** 2 * left['count'] * right['count'] / safe_count,
+    })
+
+def moments_to_stats(moments):
+    """Turn moments into the `mean`/`std` frame consumed by `process_outliers`."""
+    variance = moments['m2'] / (moments['count'] - 1).where(moments['count'] > 1)
+    return pd.DataFrame({'mean': moments['mean'], 'std': np.sqrt(variance)})
+
+def medians_from_counts(counts):
+    """Exact per-category median from a (category, value) -> count Series."""
+    medians = {}
+    for category, group in counts.sort_index().groupby(level=0, observed=True):
+        values = group.index.get_level_values(1).to_numpy()
+        cumulative = group.to_numpy().cumsum()
+        total = cumulative[-1]
+        lower = values[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+        upper = values[np.searchsorted(cumulative, total // 2, side='right')]
+        medians[category] = (lower + upper) / 2
+    return pd.Series(medians, name='price', dtype='float64').rename_axis('category')
+
+# Quantity sketches
+#
+# The 'mad' outlier method needs per-category medians, which unlike moments cannot be
+# merged from partial results. A sketch counts rows per (category, quantity) instead; with
+# a positive `accuracy` quantities are first rounded into log-spaced buckets of that
+# relative width (as in DDSketch), so a sketch holds O(log(range) / accuracy) buckets per
+# category however many rows it summarizes. Medians from a sketch are then within
+# `accuracy * |median|` of the exact ones, and MADs within `accuracy * (2 * |median| + MAD)`.
+
+SKETCH_ACCURACY = 0.01
+
+def sketch_values(values, accuracy):
+    """Round each value to the representative of its bucket; exact when `accuracy` is 0."""
+    if not accuracy:
+        return values
+    gamma = (1 + accuracy) / (1 - accuracy)
+    magnitude = np.abs(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index = np.ceil(np.log(magnitude) / np.log(gamma))
+        rounded = np.sign(values) * 2 * gamma ** index / (gamma + 1)
+    return np.where(magnitude > 0, rounded, values)
+
+def quantity_sketch(df, accuracy=SKETCH_ACCURACY):
+    """Per (category, bucketed quantity) row counts; sketches of partial frames add up."""
+    quantity = pd.Series(sketch_values(df['quantity'].to_numpy(dtype='float64'), accuracy),
+                         index=df.index, name='quantity')
+    return quantity.groupby(df['category'], observed=True).value_counts()
+
+def sketch_to_stats(counts):
+    """Turn a quantity sketch into the `median`/`mad` frame consumed by `process_outliers`."""
+    medians = medians_from_counts(counts)
+    categories = decode_categories(counts.index.get_level_values(0))
+    deviations = np.abs(counts.index.get_level_values(1).to_numpy() - medians.reindex(categories).to_numpy())
+    deviation_counts = counts.groupby([categories, deviations]).sum()
+    return pd.DataFrame({'median': medians, 'mad': medians_from_counts(deviation_counts)})
+
+def price_totals(df):
+    """Per (category, product) price sum and count, the mergeable form of `calculate_category_mean`."""
+    totals = df.groupby(["category", "product"], observed=True)['price'].agg(['sum', 'count'])
+    return totals.rename(columns={'sum': 'price_sum', 'count': 'price_count'})
+
+def summarize(df):
+    """State kept in the database so later runs can apply deltas instead of rebuilding."""
+    return {
+        'moments': quantity_moments(df),
+        'price_totals': price_totals(df),
+        'watermark': df['date'].max(),
+    }
+
+def add_partial(total, partial):
+    """Accumulate a partial aggregate (Series or DataFrame) into a running total."""
+    return partial if total is None else total.add(partial, fill_value=0)
+
+# Ingest schema
+#
+# The CSV is parsed straight into compact dtypes by the C parser: names as categoricals,
+# so each distinct string is stored once, and `date` as datetimes. `quantity` and `price`
+# are read as categoricals too, because a float column would reject tokens such as
+# 'not_a_number'; `parse_numeric` then converts only their distinct tokens.
+
+CSV_DTYPES = {
+    'transaction_id': 'Int64',
+    'category': 'category',
+    'product': 'category',
+    'quantity': 'category',
+    'price': 'category',
+}
+# Both stay float64, the dtype `coerce_numeric` works in: quantities are not always whole
+# (0.1 would round in float32) and counts above 2**24 would lose their last digits.
+NUMERIC_DTYPES = {'quantity': 'float64', 'price': 'float64'}
+
+def parse_numeric(values, dtype):
+    """Numbers from a categorical column of tokens; unparseable tokens become NaN."""
+    numbers = pd.to_numeric(pd.Series(values.cat.categories, dtype=object), errors='coerce').to_numpy(dtype)
+    return pd.Series(take_by_code(numbers, values.cat.codes.to_numpy()), index=values.index)
+
+def parse_frame(df):
+    """Coerce the numeric columns of a frame read with `CSV_DTYPES`."""
+    for column, dtype in NUMERIC_DTYPES.items():
+        if column in df:
+            df[column] = parse_numeric(df[column], dtype)
+    return df
+
+def read_csv(csv_path, chunksize=None):
+    """Read `csv_path` with the ingest schema, whole or as an iterator of chunks."""
+    reader = pd.read_csv(csv_path, dtype=CSV_DTYPES, parse_dates=['date'], date_format=DATE_FORMAT,
+                         chunksize=chunksize)
+    if chunksize:
+        return (parse_frame(chunk) for chunk in reader)
+    return parse_frame(reader)
 
-def main():
-    # Read data from CSV (you can replace 'data.csv' with the actual file path)
-    df = pd.read_csv('data.csv')
+def read_chunks(csv_path, chunksize=None):
+    """Yield the CSV as a single frame, or in chunks of `chunksize` rows."""
+    if chunksize:
+        yield from read_csv(csv_path, chunksize)
+    else:
+        yield read_csv(csv_path)
 
-    # Clean and process data
+def scan_statistics(csv_path, chunksize, sketch_accuracy=None):
+    """First pass: per-category price medians, quantity moments and the names to encode.
+
+    With a `sketch_accuracy`, a `quantity_sketch` of that accuracy is returned as well.
+    """
+    price_counts = None
+    moments = None
+    sketch = None
+    categories = set()
+    products = set()
+    for chunk in read_chunks(csv_path, chunksize):
+        chunk = coerce_numeric(chunk)
+        price_counts = add_partial(price_counts, chunk.groupby("category", observed=True)['price'].value_counts())
+        chunk_moments = quantity_moments(chunk)
+        moments = chunk_moments if moments is None else merge_moments(moments, chunk_moments)
+        if sketch_accuracy is not None:
+            sketch = add_partial(sketch, quantity_sketch(chunk, sketch_accuracy))
+        # Rows without a category never reach the output (see `process_outliers`).
+        kept = chunk[chunk['category'].notna()]
+        categories.update(kept['category'].unique())
+        products.update(kept['product'].dropna().unique())
+    if moments is None:
+        raise ValueError(f"{csv_path} contains no rows")
+    return (medians_from_counts(price_counts), moments, pd.Series(sorted(categories)), pd.Series(sorted(products)),
+            sketch)
+
+def process_in_chunks(csv_path, db_file, chunksize, outlier_method='std', outlier_threshold=OUTLIER_THRESHOLD,
+                      sketch_accuracy=SKETCH_ACCURACY):
+    """Clean, aggregate and write `csv_path` to `db_file` without loading it whole.
+
+    Produces the same tables as the in-memory path, except that the 'mad' outlier method
+    uses a quantity sketch of `sketch_accuracy`. The CSV is read twice: once to gather the
+    per-category statistics and once to clean and write the rows.
+    """
+    robust = outlier_method == 'mad'
+    medians, moments, categories, products, sketch = scan_statistics(
+        csv_path, chunksize, sketch_accuracy if robust else None)
+    stats = sketch_to_stats(sketch) if robust else moments_to_stats(moments)
+
+    totals = None
+    revenue = None
+    day_totals = None
+    watermark = None
+    staged_file = open_staging(db_file)
+    conn = sqlite3.connect(staged_file)
+    try:
+        create_schema(conn)
+        write_dictionaries(conn, categories, products)
+        for chunk in read_chunks(csv_path, chunksize):
+            chunk = clean_data(chunk, medians)
+            chunk_aggregates = aggregate(chunk)
+            totals = add_partial(totals, chunk_aggregates['price_totals'])
+            revenue = add_partial(revenue, chunk_aggregates['category_revenue'])
+            day_totals = add_partial(day_totals, chunk_aggregates['day_totals'])
+            watermark = chunk_aggregates['watermark'] if watermark is None else max(watermark, chunk_aggregates['watermark'])
+
+            df_cleaned, df_outliers = process_outliers(chunk, stats, outlier_threshold)
+            insert_rows(conn, 'sales', df_cleaned)
+            insert_rows(conn, 'outliers', df_outliers)
+
+        df_category_mean = (totals['price_sum'] / totals['price_count']).rename('price')
+        insert_frame(conn, 'category_day', max_category_day(day_totals.sort_index()))
+        insert_frame(conn, 'category_mean', df_category_mean.sort_index().reset_index())
+        insert_frame(conn, 'category_revenue', revenue.sort_index().reset_index())
+        if not robust:
+            write_refresh_state(conn, {'moments': moments, 'price_totals': totals, 'watermark': watermark},
+                                outlier_threshold)
+        finalize_database(conn)
+    finally:
+        conn.close()
+    publish_database(staged_file, db_file)
+
+# Parallel pipeline
+#
+# Every statistic of the pipeline is grouped by category, so rows can be hash-partitioned
+# by category and each partition cleaned and aggregated in its own process. No category
+# spans two partitions, so the per-partition statistics are the serial ones; the parent
+# only concatenates them and restores the input row order.
+
+def partition_by_category(df, partitions):
+    """Split `df` into `partitions` frames by a stable hash of the category."""
+    keys = pd.util.hash_pandas_object(df['category'], index=False).to_numpy() % partitions
+    return [df[keys == number] for number in range(partitions)]
+
+def process_partition(df, outlier_method='std', outlier_threshold=OUTLIER_THRESHOLD):
+    """Clean one partition and compute its statistics; runs in a worker process."""
     df = clean_data(df)
-    df_category_mean = calculate_category_mean(df)
-    df_category_revenue = calculate_category_revenue(df)
-    df_category_day = calculate_category_day(df)
-    df_cleaned, df_outliers = process_outliers(df)
+    aggregates = aggregate(df)
+    df_cleaned, df_outliers = process_outliers(df, outlier_stats(df, aggregates, outlier_method), outlier_threshold)
+    # process_outliers renumbers the rows it keeps, which are those with a category, in
+    # order; map them back to their position in the input.
+    source_rows = df.index[df['category'].notna()]
+    partials = {key: aggregates[key] for key in ['moments', 'price_totals', 'category_revenue', 'day_totals', 'watermark']}
+    return (df_cleaned.set_axis(source_rows[df_cleaned.index]),
+            df_outliers.set_axis(source_rows[df_outliers.index]),
+            partials)
+
+def process_in_parallel(df, workers, outlier_method='std', outlier_threshold=OUTLIER_THRESHOLD):
+    """Clean and aggregate raw rows on `workers` processes.
+
+    Returns the cleaned rows, the outliers and the same aggregates as `aggregate`, with rows
+    and groups in the order the serial pipeline produces them.
+    """
+    # An input without rows still goes through one (empty) partition
+    partitions = [partition for partition in partition_by_category(df, workers) if len(partition)] or [df]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(process_partition, partitions, repeat(outlier_method), repeat(outlier_threshold)))
+
+    df_cleaned = pd.concat([result[0] for result in results]).sort_index()
+    df_outliers = pd.concat([result[1] for result in results]).sort_index()
+    moments, totals, revenue, day_totals = (
+        pd.concat([result[2][key] for result in results]).sort_index()
+        for key in ['moments', 'price_totals', 'category_revenue', 'day_totals']
+    )
+    aggregates = {
+        'category_mean': (totals['price_sum'] / totals['price_count']).rename('price'),
+        'category_revenue': revenue,
+        'category_day': max_category_day(day_totals),
+        'day_totals': day_totals,
+        'stats': moments_to_stats(moments),
+        'moments': moments,
+        'price_totals': totals,
+        'watermark': pd.Series([result[2]['watermark'] for result in results]).max(),
+    }
+    return df_cleaned, df_outliers, aggregates
+
+# Incremental refresh
+#
+# A full build stores the quantity moments, price totals and the latest loaded `date`
+# (the watermark). `refresh_database` loads only rows past the watermark and applies
+# them as deltas inside one write transaction, so readers never see a partial refresh
+# and the work is proportional to the new rows rather than to the whole history.
+
+def write_refresh_state(conn, summary, outlier_threshold=OUTLIER_THRESHOLD):
+    """Store the output of `summarize` and the threshold of the 'std' outlier split.
+
+    A build without any valid row has no watermark; it is stored as an empty string, and
+    `has_refresh_state` then reports no state, so the next run rebuilds.
+    """
+    insert_frame(conn, 'quantity_moments', summary['moments'].reset_index())
+    insert_frame(conn, 'price_totals', summary['price_totals'].reset_index())
+    watermark = summary['watermark']
+    conn.execute("INSERT INTO refresh_state (key, value) VALUES ('watermark', ?)",
+                 ('' if pd.isna(watermark) else watermark.strftime(DATE_FORMAT),))
+    conn.execute("INSERT INTO refresh_state (key, value) VALUES ('outlier_threshold', ?)",
+                 (repr(float(outlier_threshold)),))
+
+def read_outlier_threshold(conn):
+    """The stored outlier threshold; databases that predate it were split at the default."""
+    row = conn.execute("SELECT value FROM refresh_state WHERE key = 'outlier_threshold'").fetchone()
+    return OUTLIER_THRESHOLD if row is None else float(row[0])
+
+def has_refresh_state(db_file, outlier_threshold=OUTLIER_THRESHOLD):
+    """Whether `db_file` was built with the state `refresh_database` relies on, at `outlier_threshold`."""
+    if not os.path.exists(db_file):
+        return False
+    conn = sqlite3.connect(db_file)
+    try:
+        row = conn.execute("SELECT value FROM refresh_state WHERE key = 'watermark'").fetchone()
+        if row is None or not row[0]:
+            return False
+        return read_outlier_threshold(conn) == outlier_threshold
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+def move_rows(conn, source, target, where, params):
+    """Move the rows of `source` matching `where` into `target`."""
+    quoted = ', '.join(f'"{column}"' for column in table_columns(conn, source))
+    conn.execute(f'INSERT INTO "{target}" ({quoted}) SELECT {quoted} FROM "{source}" WHERE {where}', params)
+    conn.execute(f'DELETE FROM "{source}" WHERE {where}', params)
+
+ROLLUP_KEYS = ['date_key', 'category_id', 'product_id']
+
+def rollup_rows(conn, table, where, params):
+    """Per (date_key, category_id, product_id) sales and row counts of the rows of `table` matching `where`."""
+    return pd.read_sql_query(
+        f"SELECT date_key, category_id, product_id, sum(total_sales) AS total_sales, count(*) AS row_count"
+        f" FROM {table}"
+        f" WHERE {where} GROUP BY date_key, category_id, product_id",
+        conn, params=params
+    )
+
+def add_to_rollup(conn, table, keys, delta):
+    """Add `delta.total_sales` and `delta.row_count` to the rows of `table` matching `keys`.
+
+    Missing rows are inserted and rows left without any `sales` row are deleted.
+    """
+    where = " AND ".join(f"{key} IS ?" for key in keys)
+    columns = ", ".join(keys + ['total_sales', 'row_count'])
+    placeholders = ", ".join("?" for _ in keys + ['total_sales', 'row_count'])
+    for row in delta.itertuples(index=False):
+        key_values = [None if pd.isna(getattr(row, key)) else int(getattr(row, key)) for key in keys]
+        values = [float(row.total_sales), int(row.row_count)]
+        updated = conn.execute(f"UPDATE {table} SET total_sales = total_sales + ?, row_count = row_count + ?"
+                               f" WHERE {where}", values + key_values)
+        if updated.rowcount == 0:
+            conn.execute(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", key_values + values)
+    conn.execute(f"DELETE FROM {table} WHERE row_count <= 0")
+
+def sum_delta(delta, keys):
+    return delta.groupby(keys, dropna=False)[['total_sales', 'row_count']].sum().reset_index()
+
+def apply_rollup_delta(conn, delta):
+    """Fold signed per-day sales and row count changes into the rollup tables."""
+    delta = sum_delta(delta, ROLLUP_KEYS)
+    if delta.empty:
+        return
+    add_to_rollup(conn, 'sales_by_day_product', ROLLUP_KEYS, delta)
+    add_to_rollup(conn, 'sales_by_product', ['category_id', 'product_id'],
+                  sum_delta(delta, ['category_id', 'product_id']))
+
+    daily = sum_delta(delta, ['date_key'])
+    for row in daily.itertuples(index=False):
+        values = (float(row.total_sales), int(row.row_count), int(row.date_key))
+        updated = conn.execute("UPDATE daily_sales SET total_sales = total_sales + ?, row_count = row_count + ?"
+                               " WHERE date_key = ?", values)
+        if updated.rowcount == 0:
+            conn.execute("INSERT INTO daily_sales (total_sales, row_count, date_key, cumulative_sales)"
+                         " VALUES (?, ?, ?, 0)", values)
+    conn.execute("DELETE FROM daily_sales WHERE row_count <= 0")
+
+    # Only prefix sums from the earliest changed day onwards need recomputing.
+    first_key = int(daily['date_key'].min())
+    previous = conn.execute("SELECT cumulative_sales FROM daily_sales WHERE date_key < ?"
+                            " ORDER BY date_key DESC LIMIT 1", (first_key,)).fetchone()
+    cumulative = previous[0] if previous else 0.0
+    updates = []
+    for date_key, total_sales in conn.execute("SELECT date_key, total_sales FROM daily_sales"
+                                              " WHERE date_key >= ? ORDER BY date_key", (first_key,)).fetchall():
+        cumulative += total_sales
+        updates.append((cumulative, date_key))
+    conn.executemany("UPDATE daily_sales SET cumulative_sales = ? WHERE date_key = ?", updates)
+
+def read_new_rows(csv_path, watermark, chunksize=None):
+    """Clean the rows of `csv_path` dated after `watermark`."""
+    new_rows = []
+    for chunk in read_chunks(csv_path, chunksize):
+        chunk = clean_data(chunk)
+        new_rows.append(chunk[chunk['date'] > watermark])
+    return pd.concat(new_rows, ignore_index=True)
+
+def apply_delta(conn, df, outlier_threshold=OUTLIER_THRESHOLD):
+    """Fold the cleaned rows in `df` into the tables of an open transaction."""
+    old_moments = pd.read_sql_query("SELECT * FROM quantity_moments", conn, index_col='category')
+    moments = merge_moments(old_moments, quantity_moments(df))
+    stats = moments_to_stats(moments)
+    bounds = outlier_bounds(stats, outlier_threshold)
+    touched = moments.index.intersection(df['category'].dropna().unique())
+    write_dictionaries(conn, df['category'], df['product'])
+    category_ids = dict(conn.execute("SELECT category, category_id FROM categories"))
+
+    # New moments shift the outlier band of every touched category, so existing rows
+    # that cross the new bounds move between `sales` and `outliers`.
+    rollup_delta = []
+    for category in touched:
+        mean, std = stats.loc[category, 'mean'], stats.loc[category, 'std']
+        lower, upper = bounds.loc[category] if pd.notna(std) else (-np.inf, np.inf)
+        params = (category_ids[category], lower, upper)
+        to_outliers = "category_id = ? AND (quantity < ? OR quantity > ?)"
+        to_sales = "category_id = ? AND quantity >= ? AND quantity <= ?"
+        removed = rollup_rows(conn, 'sales', to_outliers, params)
+        rollup_delta.append(removed.assign(total_sales=-removed['total_sales'], row_count=-removed['row_count']))
+        rollup_delta.append(rollup_rows(conn, 'outliers', to_sales, params))
+        move_rows(conn, 'sales', 'outliers', to_outliers, params)
+        move_rows(conn, 'outliers', 'sales', to_sales, params)
+        conn.execute("DELETE FROM quantity_moments WHERE category = ?", (category,))
+        conn.execute("INSERT INTO quantity_moments (category, count, mean, m2) VALUES (?, ?, ?, ?)",
+                     (category, int(moments.loc[category, 'count']), float(mean),
+                      float(moments.loc[category, 'm2'])))
+
+    df_cleaned, df_outliers = process_outliers(df, stats, outlier_threshold)
+    encoded = encode_rows(conn, df_cleaned)
+    insert_frame(conn, 'sales', encoded)
+    insert_rows(conn, 'outliers', df_outliers)
+    rollup_delta.append(encoded[ROLLUP_KEYS + ['total_sales']].assign(row_count=1))
+    apply_rollup_delta(conn, pd.concat(rollup_delta, ignore_index=True))
+
+    delta_totals = price_totals(df)
+    old_totals = pd.read_sql_query("SELECT * FROM price_totals", conn, index_col=['category', 'product'])
+    totals = add_partial(old_totals, delta_totals).loc[delta_totals.index]
+    for (category, product), row in totals.iterrows():
+        conn.execute("DELETE FROM price_totals WHERE category = ? AND product = ?", (category, product))
+        conn.execute("INSERT INTO price_totals (category, product, price_sum, price_count) VALUES (?, ?, ?, ?)",
+                     (category, product, float(row['price_sum']), int(row['price_count'])))
+        conn.execute("DELETE FROM category_mean WHERE category = ? AND product = ?", (category, product))
+        conn.execute("INSERT INTO category_mean (category, product, price) VALUES (?, ?, ?)",
+                     (category, product, float(row['price_sum'] / row['price_count'])))
+
+    for category, total_sales in df.groupby("category", observed=True)['total_sales'].sum().items():
+        updated = conn.execute("UPDATE category_revenue SET total_sales = total_sales + ? WHERE category = ?",
+                               (float(total_sales), category))
+        if updated.rowcount == 0:
+            conn.execute("INSERT INTO category_revenue (category, total_sales) VALUES (?, ?)",
+                         (category, float(total_sales)))
+
+    # New dates are all past the watermark, so a category's best day only changes when
+    # one of the new days beats (or ties) the stored maximum.
+    new_best = max_category_day(df.groupby(['category', 'date'], observed=True)['total_sales'].sum())
+    for category, best_days in new_best.groupby('category', observed=True):
+        (current_best,) = conn.execute("SELECT max(total_sales) FROM category_day WHERE category = ?",
+                                       (category,)).fetchone()
+        new_max = best_days['total_sales'].iloc[0]
+        if current_best is not None and new_max < current_best:
+            continue
+        if current_best is not None and new_max > current_best:
+            conn.execute("DELETE FROM category_day WHERE category = ?", (category,))
+        insert_frame(conn, 'category_day', best_days)
+
+    conn.execute("UPDATE refresh_state SET value = ? WHERE key = 'watermark'",
+                 (df['date'].max().strftime(DATE_FORMAT),))
+    set_generation(conn)
+
+def refresh_database(csv_path, db_file, chunksize=None):
+    """Load rows of `csv_path` newer than the stored watermark into `db_file`.
+
+    All changes are applied in a single transaction. Returns the number of new rows.
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        (watermark,) = conn.execute("SELECT value FROM refresh_state WHERE key = 'watermark'").fetchone()
+        df = read_new_rows(csv_path, pd.Timestamp(watermark), chunksize)
+        if df.empty:
+            return 0
+        outlier_threshold = read_outlier_threshold(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            apply_delta(conn, df, outlier_threshold)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        conn.execute("PRAGMA optimize")
+        return len(df)
+    finally:
+        conn.close()
+
+# Parquet export
+#
+# `export_parquet` copies the rows of a built database into Parquet datasets for columnar
+# readers, hive-partitioned by year and category (`sales/year=2024/category=Widget/`).
+# Partitioning by day or month yields thousands of small files whose per-file overhead
+# dominates a scan; within a year, the `date` row-group statistics still prune. Dates are stored as `date32`,
+# which shares the day-number representation of `date_key`, and names as dictionaries.
+# The database generation is written next to the data so readers can detect a stale copy.
+
+PARQUET_BATCH_SIZE = 1_000_000
+# Rows are buffered per partition up to this many before a row group is written;
+# otherwise every input batch leaves a sliver in each partition's file.
+PARQUET_ROW_GROUP_SIZE = 128 * 1024
+
+def parquet_schema():
+    names = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('transaction_id', pa.int64()),
+        ('date', pa.date32()),
+        ('product', names),
+        ('quantity', pa.float64()),
+        ('price', pa.float64()),
+        ('total_sales', pa.float64()),
+        ('day_of_week', pa.int8()),
+        ('high_volume', pa.bool_()),
+        ('year', names),
+        ('category', names),
+    ])
+
+def parquet_batches(conn, table, schema):
+    """Decode the rows of `table` into record batches of `schema`."""
+    categories = [name for (name,) in conn.execute("SELECT category FROM categories ORDER BY category_id")]
+    products = [name for (name,) in conn.execute("SELECT product FROM products ORDER BY product_id")]
+    for rows in pd.read_sql_query(f"SELECT * FROM {table}", conn, chunksize=PARQUET_BATCH_SIZE):
+        dates = rows['date_key'].to_numpy().astype('datetime64[D]')
+        years, year_codes = np.unique(dates.astype('datetime64[Y]'), return_inverse=True)
+        # Dictionary ids are assigned from 1 in insertion order
+        yield pa.RecordBatch.from_arrays([
+            pa.array(rows['transaction_id'], pa.int64(), from_pandas=True),
+            pa.array(dates, pa.date32()),
+            pa.array(pd.Categorical.from_codes(rows['product_id'].fillna(0).astype('int64') - 1, products)),
+            pa.array(rows['quantity'], pa.float64()),
+            pa.array(rows['price'], pa.float64()),
+            pa.array(rows['total_sales'], pa.float64()),
+            pa.array(rows['day_of_week'], pa.int8()),
+            pa.array(rows['high_volume'].astype(bool), pa.bool_()),
+            pa.DictionaryArray.from_arrays(year_codes.astype('int32'), pa.array(np.datetime_as_string(years))),
+            pa.array(pd.Categorical.from_codes(rows['category_id'].fillna(0).astype('int64') - 1, categories)),
+        ], schema=schema)
+
+def read_parquet_generation(parquet_dir):
+    """Generation of the database a Parquet copy was exported from, or None."""
+    try:
+        with open(os.path.join(parquet_dir, '_generation')) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def export_parquet(db_file, parquet_dir):
+    """Write the `sales` and `outliers` rows of `db_file` to a new copy and point `parquet_dir` at it.
+
+    Each generation is written to its own `<parquet_dir>-<generation>` directory and
+    `parquet_dir` is a symlink that is switched atomically, so a reader that resolved the
+    link keeps scanning one generation's files. The copy it replaces is kept until the next
+    export, for scans still in progress; older copies are deleted.
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to export Parquet")
+    conn = sqlite3.connect(db_file)
+    try:
+        (generation,) = conn.execute("SELECT value FROM refresh_state WHERE key = 'generation'").fetchone()
+    finally:
+        conn.close()
+    if read_parquet_generation(parquet_dir) == generation:
+        return  # e.g. an incremental run that found no new rows
+    parquet_dir = os.path.normpath(parquet_dir)
+    version_dir = f"{parquet_dir}-{generation}"
+    shutil.rmtree(version_dir, ignore_errors=True)
+    schema = parquet_schema()
+    partitioning = ds.partitioning(pa.schema([schema.field('year'), schema.field('category')]), flavor='hive')
+    # The batch generator is consumed on the writer's thread, one batch at a time
+    conn = sqlite3.connect(db_file, check_same_thread=False)
+    try:
+        for table in ['sales', 'outliers']:
+            ds.write_dataset(parquet_batches(conn, table, schema), os.path.join(version_dir, table),
+                             schema=schema, format='parquet', partitioning=partitioning,
+                             min_rows_per_group=PARQUET_ROW_GROUP_SIZE,
+                             max_rows_per_group=PARQUET_BATCH_SIZE)
+    finally:
+        conn.close()
+    # Files starting with '_' are skipped by dataset discovery
+    with open(os.path.join(version_dir, '_generation'), 'w') as f:
+        f.write(generation)
+
+    previous_dir = os.path.realpath(parquet_dir) if os.path.islink(parquet_dir) else None
+    if os.path.isdir(parquet_dir) and previous_dir is None:
+        shutil.rmtree(parquet_dir)  # a copy exported before the directories were versioned
+    staged_link = f"{parquet_dir}.staging"
+    if os.path.lexists(staged_link):
+        os.remove(staged_link)
+    # A relative target keeps the link valid wherever the volume is mounted
+    os.symlink(os.path.basename(version_dir), staged_link)
+    os.replace(staged_link, parquet_dir)
+
+    parent, prefix = os.path.split(f"{parquet_dir}-")
+    keep = {os.path.realpath(version_dir), previous_dir}
+    for name in os.listdir(parent or '.'):
+        path = os.path.join(parent, name)
+        if name.startswith(prefix) and read_parquet_generation(path) and os.path.realpath(path) not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+def main(csv_path='data.csv', db_file='data.db', chunksize=None, incremental=False, workers=None,
+         parquet_dir=None, outlier_method='std', outlier_threshold=OUTLIER_THRESHOLD, sketch_accuracy=SKETCH_ACCURACY):
+    if chunksize and workers and workers > 1:
+        raise ValueError("chunksize and workers cannot be combined")
+    if outlier_method not in OUTLIER_METHODS:
+        raise ValueError(f"Unknown outlier method {outlier_method!r}, expected one of {OUTLIER_METHODS}")
+    # Refresh state is only kept for the 'std' method, whose moments merge exactly; other
+    # builds (or a changed threshold) fall through to a full rebuild.
+    if incremental and outlier_method == 'std' and has_refresh_state(db_file, outlier_threshold):
+        added = refresh_database(csv_path, db_file, chunksize)
+        print(f"Incremental refresh complete: {added} new rows loaded.")
+    elif chunksize:
+        process_in_chunks(csv_path, db_file, chunksize, outlier_method, outlier_threshold, sketch_accuracy)
+        print("Data processing complete and database created successfully.")
+    else:
+        # Read data from CSV (you can replace 'data.csv' with the actual file path)
+        df = read_csv(csv_path)
+
+        # Clean and process data
+        if workers and workers > 1:
+            df_cleaned, df_outliers, aggregates = process_in_parallel(df, workers, outlier_method, outlier_threshold)
+        else:
+            df = clean_data(df)
+            aggregates = aggregate(df)
+            df_cleaned, df_outliers = process_outliers(df, outlier_stats(df, aggregates, outlier_method),
+                                                       outlier_threshold)
 
-    # Set database file path (you can replace it with a custom path)
-    db_file = 'data.db'
+        # Create SQLite database and save tables
+        create_database(df_cleaned, df_outliers, aggregates['category_day'], aggregates['category_mean'],
+                        aggregates['category_revenue'], db_file, aggregates if outlier_method == 'std' else None,
+                        outlier_threshold)
+        print("Data processing complete and database created successfully.")
 
-    # Create SQLite database and save tables
-    create_database(df_cleaned, df_outliers, df_category_day, df_category_mean, df_category_revenue, db_file)
-    print("Data processing complete and database created successfully.")
+    if parquet_dir:
+        export_parquet(db_file, parquet_dir)
+        print(f"Parquet copy written to {parquet_dir}.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Clean sales data and build the SQLite database.")
+    parser.add_argument("--csv", default="data.csv", help="Input CSV file")
+    parser.add_argument("--db", default="data.db", help="Output SQLite database file")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream the CSV in chunks of this many rows instead of loading it whole")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only load rows newer than those already in the database")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Clean and aggregate on this many processes, partitioning the rows by category")
+    parser.add_argument("--parquet", default=None, metavar="DIR",
+                        help="Also write the sales and outliers rows as partitioned Parquet under DIR")
+    parser.add_argument("--outlier-method", choices=OUTLIER_METHODS, default='std',
+                        help="Flag outliers by distance from the category mean in standard deviations ('std') "
+                             "or from the median in scaled median absolute deviations ('mad')")
+    parser.add_argument("--outlier-threshold", type=float, default=OUTLIER_THRESHOLD,
+                        help="Number of scales from the category center beyond which a quantity is an outlier")
+    parser.add_argument("--sketch-accuracy", type=float, default=SKETCH_ACCURACY,
+                        help="Relative accuracy of the quantity sketch used by --outlier-method mad with --chunksize")
+    args = parser.parse_args()
+    main(args.csv, args.db, args.chunksize, args.incremental, args.workers, args.parquet,
+         args.outlier_method, args.outlier_threshold, args.sketch_accuracy)
\ No newline at end of file
@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 import pandas as pd
 import sqlite3
 from ..DataCleaningSetUp import (
@@ -7,7 +8,19 @@ from ..DataCleaningSetUp import (
     calculate_category_revenue,
     calculate_category_day,
     process_outliers,
-    create_database
+    aggregate,
+    summarize,
+    create_database,
+    quantity_moments,
+    merge_moments,
+    moments_to_stats,
+    medians_from_counts,
+    quantity_sketch,
+    sketch_to_stats,
+    has_refresh_state,
+    read_csv,
+    export_parquet,
+    main
 )
 
 # Fixtures for sample data and temporary paths
@@ -62,6 +75,39 @@ def test_clean_data(sample_data):
     # Test high_volume flag
     assert all(df['high_volume'].isin([True, False]))
 
+def test_read_csv_applies_ingest_schema(sample_data, tmp_path):
+    csv_path = tmp_path / "data.csv"
+    sample_data.to_csv(csv_path, index=False)
+
+    df = read_csv(str(csv_path))
+
+    assert isinstance(df['category'].dtype, pd.CategoricalDtype)
+    assert isinstance(df['product'].dtype, pd.CategoricalDtype)
+    assert df['quantity'].dtype == np.float64
+    assert df['price'].dtype == np.float64
+    assert pd.api.types.is_datetime64_any_dtype(df['date'])
+    # 'not_a_number' is coerced while parsing, like clean_data does for raw frames
+    expected = pd.to_numeric(sample_data['price'], errors='coerce')
+    pd.testing.assert_series_equal(df['price'], expected, check_names=False)
+    pd.testing.assert_frame_equal(clean_data(df)[['quantity', 'price', 'total_sales']],
+                                  clean_data(sample_data.copy())[['quantity', 'price', 'total_sales']])
+
+def test_read_csv_keeps_exact_quantities(tmp_path):
+    csv_path = tmp_path / "data.csv"
+    pd.DataFrame({
+        'date': ['2024-07-01', '2024-07-01', '2024-07-02'],
+        'category': ['Widget', 'Widget', 'Gadget'],
+        'product': ['Widget-A', 'Widget-B', 'Gadget-X'],
+        'quantity': ['0.1', '16777217', '2.5'],
+        'price': ['3', '1', '0.2'],
+    }).to_csv(csv_path, index=False)
+
+    df = clean_data(read_csv(str(csv_path)))
+
+    assert df['quantity'].tolist() == [0.1, 16777217.0, 2.5]
+    assert df['total_sales'].tolist() == [0.1 * 3, 16777217.0, 2.5 * 0.2]
+    assert df['total_sales'].sum() == 0.1 * 3 + 16777217.0 + 2.5 * 0.2
+
 # Tests for calculate_category_mean
 def test_calculate_category_mean(sample_data):
     df = clean_data(sample_data)
@@ -118,6 +164,22 @@ def test_process_outliers(sample_data):
     )
     assert all(outlier_condition)
 
+# Tests for aggregate
+def test_aggregate_matches_groupby(sample_data):
+    df = clean_data(pd.concat([sample_data] * 3, ignore_index=True))
+    df.loc[0, 'category'] = None
+    aggregates = aggregate(df)
+
+    pd.testing.assert_series_equal(aggregates['category_mean'], calculate_category_mean(df))
+    pd.testing.assert_series_equal(aggregates['category_revenue'], calculate_category_revenue(df))
+    pd.testing.assert_frame_equal(aggregates['category_day'], calculate_category_day(df))
+    pd.testing.assert_frame_equal(aggregates['stats'], df.groupby("category")['quantity'].agg(['mean', 'std']),
+                                  check_names=False)
+    summary = summarize(df)
+    pd.testing.assert_frame_equal(aggregates['moments'], summary['moments'], check_names=False)
+    pd.testing.assert_frame_equal(aggregates['price_totals'], summary['price_totals'])
+    assert aggregates['watermark'] == summary['watermark']
+
 # Tests for create_database
 def test_create_database(sample_data, temp_db_path):
     df = clean_data(sample_data)
@@ -145,4 +207,283 @@ def test_create_database(sample_data, temp_db_path):
         assert 'outliers' in table_names
         assert 'category_day' in table_names
         assert 'category_mean' in table_names
-        assert 'category_revenue' in table_names
\ No newline at end of file
+        assert 'category_revenue' in table_names
+
+# Tests for the streaming helpers
+def test_merge_moments_matches_full_frame(sample_data):
+    df = clean_data(sample_data)
+    merged = merge_moments(quantity_moments(df.iloc[:3]), quantity_moments(df.iloc[3:]))
+    stats = moments_to_stats(merged)
+    expected = df.groupby("category")['quantity'].agg(['mean', 'std'])
+
+    pd.testing.assert_frame_equal(stats.sort_index(), expected, check_names=False)
+
+def test_medians_from_counts():
+    values = pd.DataFrame({
+        'category': ['A', 'A', 'A', 'A', 'B', 'B', 'B'],
+        'price': [1.0, 4.0, 2.0, 10.0, 3.0, 3.0, 7.0]
+    })
+    counts = values.groupby('category')['price'].value_counts()
+    medians = medians_from_counts(counts)
+
+    pd.testing.assert_series_equal(medians, values.groupby('category')['price'].median())
+
+def test_sketch_to_stats_within_accuracy():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'category': rng.choice(['A', 'B', 'C'], 5000),
+        'quantity': np.round(rng.lognormal(2, 1, 5000), 2)
+    })
+    grouped = df.groupby('category')['quantity']
+    median = grouped.median()
+    mad = (df['quantity'] - df['category'].map(median)).abs().groupby(df['category']).median()
+
+    exact = sketch_to_stats(quantity_sketch(df, accuracy=0))
+    pd.testing.assert_series_equal(exact['median'], median, check_names=False)
+    pd.testing.assert_series_equal(exact['mad'], mad, check_names=False)
+
+    # Sketches of partial frames merge by addition
+    accuracy = 0.01
+    sketch = quantity_sketch(df.iloc[:2000], accuracy).add(quantity_sketch(df.iloc[2000:], accuracy), fill_value=0)
+    approximate = sketch_to_stats(sketch)
+    assert ((approximate['median'] - median).abs() <= accuracy * median.abs()).all()
+    assert ((approximate['mad'] - mad).abs() <= accuracy * (2 * median.abs() + mad)).all()
+
+def test_process_outliers_mad_threshold(sample_data):
+    df = clean_data(sample_data)
+    stats = sketch_to_stats(quantity_sketch(df, accuracy=0))
+    df_cleaned, df_outliers = process_outliers(df, stats, threshold=1.0)
+
+    bounds = stats.loc[df_outliers['category']]
+    assert ((df_outliers['quantity'].to_numpy() < (bounds['median'] - 1.4826 * bounds['mad']).to_numpy()) |
+            (df_outliers['quantity'].to_numpy() > (bounds['median'] + 1.4826 * bounds['mad']).to_numpy())).all()
+    assert len(df_cleaned) + len(df_outliers) == df['category'].notna().sum()
+
+def test_chunked_main_matches_in_memory(sample_data, tmp_path):
+    csv_path = tmp_path / "data.csv"
+    pd.concat([sample_data] * 5).to_csv(csv_path, index=False)
+    in_memory_db = tmp_path / "in_memory.db"
+    chunked_db = tmp_path / "chunked.db"
+
+    main(str(csv_path), str(in_memory_db))
+    main(str(csv_path), str(chunked_db), chunksize=4)
+
+    with sqlite3.connect(str(in_memory_db)) as expected_conn, sqlite3.connect(str(chunked_db)) as conn:
+        for table in ['sales', 'outliers', 'category_day', 'category_mean', 'category_revenue']:
+            expected = pd.read_sql_query(f"SELECT * FROM {table}", expected_conn)
+            actual = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+            pd.testing.assert_frame_equal(actual, expected)
+
+def test_parallel_main_matches_serial(sample_data, tmp_path):
+    csv_path = tmp_path / "data.csv"
+    pd.concat([sample_data] * 5).to_csv(csv_path, index=False)
+    serial_db = tmp_path / "serial.db"
+    parallel_db = tmp_path / "parallel.db"
+
+    main(str(csv_path), str(serial_db))
+    main(str(csv_path), str(parallel_db), workers=3)
+
+    with sqlite3.connect(str(serial_db)) as expected_conn, sqlite3.connect(str(parallel_db)) as conn:
+        for table in ['sales', 'outliers', 'category_day', 'category_mean', 'category_revenue',
+                      'quantity_moments', 'price_totals', 'daily_sales']:
+            expected = pd.read_sql_query(f"SELECT * FROM {table}", expected_conn)
+            actual = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+            pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+
+def test_chunked_main_mad_matches_in_memory(sample_data, tmp_path):
+    csv_path = tmp_path / "data.csv"
+    pd.concat([sample_data] * 5).to_csv(csv_path, index=False)
+    in_memory_db = tmp_path / "in_memory.db"
+    chunked_db = tmp_path / "chunked.db"
+
+    main(str(csv_path), str(in_memory_db), outlier_method='mad', outlier_threshold=1.5)
+    main(str(csv_path), str(chunked_db), chunksize=4, outlier_method='mad', outlier_threshold=1.5,
+         sketch_accuracy=0)
+
+    with sqlite3.connect(str(in_memory_db)) as expected_conn, sqlite3.connect(str(chunked_db)) as conn:
+        for table in ['sales', 'outliers']:
+            expected = pd.read_sql_query(f"SELECT * FROM {table}", expected_conn)
+            actual = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+            pd.testing.assert_frame_equal(actual, expected)
+    # Medians do not merge exactly, so these builds are never refreshed incrementally
+    assert not has_refresh_state(str(in_memory_db))
+
+def test_export_parquet_matches_database(sample_data, tmp_path):
+    ds = pytest.importorskip("pyarrow.dataset")
+    csv_path = tmp_path / "data.csv"
+    sample_data.to_csv(csv_path, index=False)
+    db_file = tmp_path / "data.db"
+    parquet_dir = tmp_path / "parquet"
+
+    main(str(csv_path), str(db_file), parquet_dir=str(parquet_dir))
+
+    sales = ds.dataset(str(parquet_dir / "sales"), format="parquet", partitioning="hive").to_table().to_pandas()
+    with sqlite3.connect(str(db_file)) as conn:
+        expected = pd.read_sql_query("SELECT * FROM sales_view", conn)
+        (generation,) = conn.execute("SELECT value FROM refresh_state WHERE key = 'generation'").fetchone()
+    assert (parquet_dir / "_generation").read_text() == generation
+    assert set(sales['category'].astype(str)) == set(expected['category'])
+    assert sorted(sales['date'].astype(str)) == sorted(expected['date'])
+    assert sales.groupby(sales['date'].astype(str))['total_sales'].sum().to_dict() == \
+        expected.groupby('date')['total_sales'].sum().to_dict()
+
+def test_export_parquet_switches_versioned_copies(sample_data, tmp_path):
+    ds = pytest.importorskip("pyarrow.dataset")
+    csv_path = tmp_path / "data.csv"
+    sample_data.to_csv(csv_path, index=False)
+    db_file = tmp_path / "data.db"
+    parquet_dir = tmp_path / "parquet"
+    main(str(csv_path), str(db_file), parquet_dir=str(parquet_dir))
+    first_dir = parquet_dir.resolve()
+    first = ds.dataset(str(first_dir / "sales"), format="parquet", partitioning="hive")
+    expected = first.to_table().num_rows
+
+    generations = []
+    for generation in ['second', 'third']:
+        with sqlite3.connect(str(db_file)) as conn:
+            conn.execute("DELETE FROM sales WHERE rowid = (SELECT max(rowid) FROM sales)")
+            conn.execute("UPDATE refresh_state SET value = ? WHERE key = 'generation'", (generation,))
+        export_parquet(str(db_file), str(parquet_dir))
+        generations.append(parquet_dir.resolve())
+        if generation == 'second':
+            # A dataset opened before the switch still scans the files of its own export
+            assert first.to_table().num_rows == expected
+
+    assert parquet_dir.is_symlink()
+    assert generations == [tmp_path / "parquet-second", tmp_path / "parquet-third"]
+    assert (parquet_dir / "_generation").read_text() == 'third'
+    # The replaced copy is kept for scans in progress, older ones are deleted
+    assert not first_dir.exists()
+    assert generations[0].exists()
+
+# Tests for the incremental refresh
+def test_incremental_refresh_matches_full_build(tmp_path):
+    rng = np.random.default_rng(0)
+    history = pd.DataFrame({
+        'date': pd.date_range('2024-07-01', periods=10).repeat(20).strftime('%Y-%m-%d'),
+        'category': rng.choice(['Widget', 'Gadget', 'Doodad'], 200),
+        'product': rng.choice(['A', 'B', 'C'], 200),
+        'quantity': rng.choice([1, 2, 3, 4, 40, None], 200),
+        'price': rng.choice(['9.99', '4.5', 'not_a_number', ''], 200)
+    })
+    full_csv = tmp_path / "full.csv"
+    partial_csv = tmp_path / "partial.csv"
+    history.to_csv(full_csv, index=False)
+    history[history['date'] < '2024-07-06'].to_csv(partial_csv, index=False)
+    full_db = tmp_path / "full.db"
+    refreshed_db = tmp_path / "refreshed.db"
+
+    main(str(full_csv), str(full_db))
+    main(str(partial_csv), str(refreshed_db), incremental=True)
+    assert has_refresh_state(str(refreshed_db))
+    generation_query = "SELECT value FROM refresh_state WHERE key = 'generation'"
+    with sqlite3.connect(str(refreshed_db)) as conn:
+        (generation,) = conn.execute(generation_query).fetchone()
+    main(str(full_csv), str(refreshed_db), incremental=True)
+    with sqlite3.connect(str(refreshed_db)) as conn:
+        assert conn.execute(generation_query).fetchone()[0] != generation
+
+    with sqlite3.connect(str(full_db)) as expected_conn, sqlite3.connect(str(refreshed_db)) as conn:
+        decoded_rollup = (
+            "(SELECT c.category, p.product, r.total_sales, r.row_count FROM sales_by_product r"
+            " LEFT JOIN categories c ON c.category_id = r.category_id"
+            " LEFT JOIN products p ON p.product_id = r.product_id)"
+        )
+        for table in ['sales_view', 'outliers_view', 'category_day', 'category_mean', 'category_revenue',
+                      'daily_sales', decoded_rollup]:
+            expected = pd.read_sql_query(f"SELECT * FROM {table}", expected_conn)
+            actual = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+            columns = list(expected.columns)
+            pd.testing.assert_frame_equal(
+                actual.sort_values(columns).reset_index(drop=True),
+                expected.sort_values(columns).reset_index(drop=True)
+            )
+
+def test_incremental_refresh_drops_emptied_rollup_rows(tmp_path):
+    # Product B only sells on 2024-07-03, inside the band of the first five days; the
+    # low quantities of the later days narrow the band so both of its rows turn into outliers.
+    history = pd.DataFrame({
+        'date': ['2024-07-0%d' % day for day in range(1, 6) for _ in range(4)] + ['2024-07-03'] * 2
+                + ['2024-07-%02d' % day for day in range(6, 11) for _ in range(20)],
+        'category': 'Widget',
+        'product': ['A'] * 20 + ['B'] * 2 + ['A'] * 100,
+        'quantity': [4, 5, 6, 5] * 5 + [6, 6] + [5] * 100,
+        'price': '2.5'
+    })
+    full_csv = tmp_path / "full.csv"
+    partial_csv = tmp_path / "partial.csv"
+    history.to_csv(full_csv, index=False)
+    history[history['date'] < '2024-07-06'].to_csv(partial_csv, index=False)
+    full_db = tmp_path / "full.db"
+    refreshed_db = tmp_path / "refreshed.db"
+
+    main(str(full_csv), str(full_db))
+    main(str(partial_csv), str(refreshed_db), incremental=True)
+    product_b = "SELECT count(*) FROM sales_by_product WHERE product_id = (SELECT product_id FROM products" \
+                " WHERE product = 'B')"
+    with sqlite3.connect(str(refreshed_db)) as conn:
+        assert conn.execute(product_b).fetchone() == (1,)
+    main(str(full_csv), str(refreshed_db), incremental=True)
+
+    with sqlite3.connect(str(full_db)) as expected_conn, sqlite3.connect(str(refreshed_db)) as conn:
+        assert conn.execute(product_b).fetchone() == (0,)
+        assert conn.execute("SELECT count(*) FROM outliers_view WHERE product = 'B'").fetchone() == (2,)
+        for table in ['sales_view', 'outliers_view', 'sales_by_day_product', 'sales_by_product', 'daily_sales']:
+            expected = pd.read_sql_query(f"SELECT * FROM {table}", expected_conn)
+            actual = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+            columns = list(expected.columns)
+            pd.testing.assert_frame_equal(
+                actual.sort_values(columns).reset_index(drop=True),
+                expected.sort_values(columns).reset_index(drop=True)
+            )
+
+@pytest.mark.parametrize("options", [{}, {'chunksize': 4}, {'workers': 2}])
+def test_main_builds_empty_database(sample_data, tmp_path, options):
+    csv_path = tmp_path / "empty.csv"
+    sample_data.iloc[:0].to_csv(csv_path, index=False)
+    db_file = tmp_path / "empty.db"
+
+    main(str(csv_path), str(db_file), **options)
+
+    with sqlite3.connect(str(db_file)) as conn:
+        assert conn.execute("SELECT count(*) FROM sales").fetchone() == (0,)
+    # Without a watermark the next incremental run rebuilds from scratch
+    assert not has_refresh_state(str(db_file))
+    sample_data.to_csv(csv_path, index=False)
+    main(str(csv_path), str(db_file), incremental=True)
+    with sqlite3.connect(str(db_file)) as conn:
+        assert conn.execute("SELECT count(*) FROM sales").fetchone()[0] > 0
+        assert conn.execute("SELECT value FROM refresh_state WHERE key = 'watermark'").fetchone() == ('2024-07-03',)
+
+def test_create_database_schema(sample_data, temp_db_path):
+    df = clean_data(sample_data)
+    df_cleaned, df_outliers = process_outliers(df)
+    create_database(
+        df_cleaned,
+        df_outliers,
+        calculate_category_day(df),
+        calculate_category_mean(df),
+        calculate_category_revenue(df),
+        str(temp_db_path)
+    )
+
+    with sqlite3.connect(str(temp_db_path)) as conn:
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert {'idx_sales_category_product', 'idx_sales_date'} <= indexes
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+        # The view decodes the dictionary and date keys back to the cleaned values
+        decoded = pd.read_sql_query("SELECT * FROM sales_view", conn)
+        assert list(decoded.columns) == ['transaction_id'] + list(df_cleaned.columns)
+        assert decoded['category'].tolist() == df_cleaned['category'].tolist()
+        assert decoded['product'].tolist() == df_cleaned['product'].tolist()
+        assert decoded['date'].tolist() == df_cleaned['date'].dt.strftime('%Y-%m-%d').tolist()
+        assert decoded['day_of_week'].tolist() == df_cleaned['day_of_week'].tolist()
+
+        # Rollups agree with the raw rows and daily_sales carries prefix sums
+        daily = pd.read_sql_query("SELECT * FROM daily_sales ORDER BY date_key", conn)
+        expected_daily = df_cleaned.groupby('date')['total_sales'].sum()
+        assert daily['total_sales'].tolist() == pytest.approx(expected_daily.tolist())
+        assert daily['cumulative_sales'].tolist() == pytest.approx(expected_daily.cumsum().tolist())
+        (rollup_total,) = conn.execute("SELECT sum(total_sales) FROM sales_by_product").fetchone()
+        assert rollup_total == pytest.approx(df_cleaned['total_sales'].sum())
@@ -1,31 +1,58 @@
 import dash
-import requests
+import json
+import math
 from dash import dcc, html, dash_table
 import pandas as pd
 import plotly.graph_objects as go
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import plotly.express as px
+from backend_client import frame_params, get_frame, get_json, prefetch
+
+OUTLIERS_PAGE_SIZE = 5
+# How often open dashboards ask the backend whether its data changed
+GENERATION_POLL_MS = 30_000
+# The category statistics bundle three tables, so they come as column-oriented JSON
+CATEGORY_PARAMS = {'format': 'columns'}
+# The daily sales plot asks for about one point per PIXELS_PER_POINT pixels of its width:
+# the largest of DAILY_POINTS_LEVELS that fits, so that screens share a few cacheable
+# requests while every plot gets more than half the points it can show. The backend warms
+# these levels; WARM_DAILY_POINTS in backend/main.py must list the same values.
+PIXELS_PER_POINT = 2
+DAILY_POINTS_LEVELS = [64, 128, 256, 512, 1024, 2048]
+
+# DataTable filter operators and the backend filter operator each one maps to
+TABLE_FILTER_OPERATORS = [
+    (['ge ', '>='], 'ge'),
+    (['le ', '<='], 'le'),
+    (['lt ', '<'], 'lt'),
+    (['gt ', '>'], 'gt'),
+    (['ne ', '!='], 'ne'),
+    (['eq ', '='], 'eq'),
+    (['contains '], 'contains'),
+    (['datestartswith '], 'starts'),
+]
 
 # Create Dash app
-app = dash.Dash(__name__)
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
 
-def get_filters_data():
+def get_generation():
+    """The backend's current data generation, or None when it cannot be reached."""
+    response = get_json('/generation', cache=False)
+    return response['generation'] if response else None
+
+def get_filters_data(generation=None):
     categories = []
     products = []
-    response = requests.get('http://backend:8000/sales/filter_values')
-    if response.status_code == 200:
-        params_values = response.json()
+    params_values = get_json('/sales/filter_values', generation=generation)
+    if params_values is not None:
         categories = params_values['categories']
         products = params_values['products']
-    else:
-        print(f"Error: {response.status_code}")
-        print(response.text)
     return categories, products
 
-def get_aggregated_figs():
-    agg_rsp = requests.get('http://backend:8000/sales/category')
-    if agg_rsp.status_code == 200:
-        agg_data = agg_rsp.json()
+def get_aggregated_figs(generation=None):
+    revenue_fig = avg_price_fig = highest_sales_fig = go.Figure()
+    agg_data = get_json('/sales/category', CATEGORY_PARAMS, generation=generation)
+    if agg_data is not None:
         revenue_df = pd.DataFrame(agg_data['revenue'])
         revenue_fig = px.pie(revenue_df, names='category', values='total_sales', hole=0.4, title='Total Revenue by Category')
 
@@ -45,87 +72,252 @@ def get_aggregated_figs():
     return revenue_fig, avg_price_fig, highest_sales_fig
 
 
-def get_outliers_data():
-    outliers_rsp = requests.get('http://backend:8000/sales/outliers')
-    if outliers_rsp.status_code == 200:
-        outliers = outliers_rsp.json()
-        outliers_columns = [{"name": col, "id": col} for col in outliers[0].keys()] if len(outliers) > 0 else []
-    return outliers, outliers_columns
-
-categories, products = get_filters_data()
-outliers, outliers_columns = get_outliers_data()
-revenue_fig, avg_price_fig, highest_sales_day_fig = get_aggregated_figs()
-
-
-# Define the layout
-app.layout = html.Div(children=[
-    html.H1(children='Sales Dashboard'),
-    
-    # Dropdown for selecting category
-    dcc.Dropdown(
-        id='category-dropdown',
-        options=[{'label': 'None', 'value': 'None'}] + [{'label': cat, 'value': cat} for cat in categories if cat is not None],
-        value='None',  # Default value
-        multi=False,
-        placeholder='Select a Category'
-    ),
-    
-    # Dropdown for selecting product name
-    dcc.Dropdown(
-        id='product-dropdown',
-        options=[{'label': 'None', 'value': 'None'}] + [{'label': product, 'value': product} for product in products if product is not None],
-        value='None',  # Default value
-        multi=False,
-        placeholder='Select a Product'
-    ),
-
-    dcc.Graph(id='product-sales-plot'),
-
-    dcc.DatePickerRange(
-        id="date-picker-range",
-        start_date=None,
-        end_date=None,
-        display_format="YYYY-MM-DD",
-        month_format="YYYY-MM",
-    ),
-    dcc.Graph(id='daily-sales-plot'),
-
-    dcc.Graph(id='avg-price-plot', figure=avg_price_fig),
-    dcc.Graph(id='total-revenue-plot', figure=revenue_fig),
-    dcc.Graph(id='highest-sales-day-plot', figure=highest_sales_day_fig),
-
-
-    html.H2("Outliers"),
-    dash_table.DataTable(
-        id="json-table",
-        columns=outliers_columns,          # Define table columns
-        data=outliers,           # Pass the JSON data as rows
-        filter_action="native",   # Enable filtering
-        sort_action="native",     # Enable sorting
-        page_action="native",     # Enable pagination
-        page_size=5,              # Show 5 rows per page
-        style_table={"overflowX": "auto"},
-        style_header={"backgroundColor": "rgb(230, 230, 230)", "fontWeight": "bold"},
-        style_data={"whiteSpace": "normal", "height": "auto"},
-    ) if len(outliers) > 0 else html.H3("No outliers to show")
-])
+def split_filter_part(filter_part):
+    """Splits one DataTable filter expression, e.g. `{quantity} > 10`, into column, operator and value."""
+    for table_operators, operator in TABLE_FILTER_OPERATORS:
+        for table_operator in table_operators:
+            if table_operator in filter_part:
+                name_part, value_part = filter_part.split(table_operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value = value_part.strip()
+                if len(value) > 1 and value[0] == value[-1] and value[0] in ("'", '"', '`'):
+                    value = value[1:-1].replace('\\' + value[0], value[0])
+                return name, operator, value
+    return None, None, None
 
-@app.callback(
-    Output('product-sales-plot', 'figure'),
-    [Input('category-dropdown', 'value'),
-     Input('product-dropdown', 'value')]
-)
-def update_products_plot(selected_category, selected_product):
-    # Filter the data based on the selected category and product
-    params = {}
+def to_outlier_filters(filter_query):
+    """Translates a DataTable filter query into the backend's `column:operator:value` filters."""
+    filters = []
+    for filter_part in (filter_query or '').split(' && '):
+        name, operator, value = split_filter_part(filter_part)
+        if name:
+            filters.append(f'{name}:{operator}:{value}')
+    return filters
+
+def outliers_page_params(page_current, page_size, sort_by=None, filter_query='', cursor=None):
+    params = {'limit': page_size, 'filter': to_outlier_filters(filter_query)}
+    if cursor:
+        params['cursor'] = cursor
+    else:
+        params['offset'] = page_current * page_size
+    if sort_by:
+        params['sort_by'] = sort_by[0]['column_id']
+        params['descending'] = 'true' if sort_by[0]['direction'] == 'desc' else 'false'
+    return params
 
+def get_outliers_page(page_current, page_size, sort_by=None, filter_query='', cursor=None, generation=None):
+    """Fetches one page of outliers, continuing from a keyset cursor when one is known."""
+    params = outliers_page_params(page_current, page_size, sort_by, filter_query, cursor)
+    return get_json('/sales/outliers', params, default={'rows': [], 'total': 0, 'next_cursor': None},
+                    generation=generation)
+
+def products_params(selected_category, selected_product):
+    params = {}
     if selected_category != 'None':
         params['category'] = selected_category
     if selected_product != 'None':
         params['product'] = selected_product
+    return params
+
+def daily_points(width):
+    """Number of points the daily sales plot can show at `width` pixels, None before it is measured."""
+    if not width:
+        return None
+    fitting = [level for level in DAILY_POINTS_LEVELS if level <= int(width) // PIXELS_PER_POINT]
+    return fitting[-1] if fitting else DAILY_POINTS_LEVELS[0]
+
+def daily_params(start_date, end_date, width):
+    params = {}
+    if start_date:
+        params['start_date'] = start_date
+    if end_date:
+        params['end_date'] = end_date
+    # Long ranges are downsampled by the backend to what the plot can display
+    points = daily_points(width)
+    if points:
+        params['points'] = points
+    return params
+
+def section_queries(category, product, start_date, end_date, width, page_current, page_size, sort_by, filter_query):
+    """The requests the sections make when the data generation changes, with the current controls."""
+    return [
+        ('/sales/filter_values', None),
+        ('/sales/category', CATEGORY_PARAMS),
+        ('/sales/product', frame_params(products_params(category, product))),
+        ('/sales/day', frame_params(daily_params(start_date, end_date, width))),
+        ('/sales/outliers', outliers_page_params(page_current or 0, page_size, sort_by, filter_query)),
+    ]
+
+def outliers_columns(outliers):
+    return [
+        {"name": col, "id": col, "type": 'numeric' if isinstance(value, (int, float)) else 'text'}
+        for col, value in outliers[0].items()
+    ] if len(outliers) > 0 else []
+
+def dropdown_options(values):
+    return [{'label': 'None', 'value': 'None'}] + [{'label': value, 'value': value} for value in values if value is not None]
+
+
+# The layout is served as an empty shell; every section loads through its own callback once
+# the page knows the backend's data generation, so the server starts without the backend
+# and pages refresh when the data changes.
+def serve_layout():
+    return html.Div(children=[
+        html.H1(children='Sales Dashboard'),
+
+        # Polls the backend's data generation; a change reloads every section
+        dcc.Interval(id='generation-poll', interval=GENERATION_POLL_MS),
+        dcc.Store(id='data-generation'),
+
+        # Dropdown for selecting category
+        dcc.Dropdown(
+            id='category-dropdown',
+            options=dropdown_options([]),
+            value='None',  # Default value
+            multi=False,
+            placeholder='Select a Category'
+        ),
+
+        # Dropdown for selecting product name
+        dcc.Dropdown(
+            id='product-dropdown',
+            options=dropdown_options([]),
+            value='None',  # Default value
+            multi=False,
+            placeholder='Select a Product'
+        ),
+
+        dcc.Loading(dcc.Graph(id='product-sales-plot')),
+
+        dcc.DatePickerRange(
+            id="date-picker-range",
+            start_date=None,
+            end_date=None,
+            display_format="YYYY-MM-DD",
+            month_format="YYYY-MM",
+        ),
+        dcc.Loading(dcc.Graph(id='daily-sales-plot')),
+        # Width of the daily sales plot in pixels, measured in the browser
+        dcc.Store(id='daily-plot-width'),
+
+        dcc.Loading(dcc.Graph(id='avg-price-plot')),
+        dcc.Loading(dcc.Graph(id='total-revenue-plot')),
+        dcc.Loading(dcc.Graph(id='highest-sales-day-plot')),
 
-    filtered_data = requests.get('http://backend:8000/sales/product', params=params).json()
-    filtered_data = pd.DataFrame(filtered_data)
+
+        html.H2("Outliers"),
+        html.H3(id='outliers-message'),
+        # Keyset cursors of the pages visited so far, for the current sort and filters
+        dcc.Store(id='outliers-cursors', data={}),
+        dash_table.DataTable(
+            id="json-table",
+            columns=[],               # Set with the first page
+            data=[],                  # Pages are fetched on demand
+            filter_action="custom",   # Filter in the backend
+            filter_query='',
+            sort_action="custom",     # Sort in the backend
+            sort_mode="single",
+            sort_by=[],
+            page_action="custom",     # Paginate in the backend
+            page_current=0,
+            page_size=OUTLIERS_PAGE_SIZE,
+            page_count=1,
+            style_table={"overflowX": "auto"},
+            style_header={"backgroundColor": "rgb(230, 230, 230)", "fontWeight": "bold"},
+            style_data={"whiteSpace": "normal", "height": "auto"},
+        )
+    ])
+
+app.layout = serve_layout
+
+@app.callback(
+    Output('data-generation', 'data'),
+    [Input('generation-poll', 'n_intervals')],
+    [State('data-generation', 'data'),
+     State('category-dropdown', 'value'),
+     State('product-dropdown', 'value'),
+     State('date-picker-range', 'start_date'),
+     State('date-picker-range', 'end_date'),
+     State('daily-plot-width', 'data'),
+     State('json-table', 'page_current'),
+     State('json-table', 'page_size'),
+     State('json-table', 'sort_by'),
+     State('json-table', 'filter_query')]
+)
+def update_generation(_, current_generation, category, product, start_date, end_date, width,
+                      page_current, page_size, sort_by, filter_query):
+    generation = get_generation()
+    # Keep the sections as they are while the backend is unreachable or unchanged
+    if generation is None or generation == current_generation:
+        return dash.no_update
+    # Load every section in one round trip from one database snapshot; the section callbacks
+    # then find their responses in the client cache under the snapshot's generation
+    queries = section_queries(category, product, start_date, end_date, width,
+                              page_current, page_size, sort_by, filter_query)
+    return prefetch(queries) or generation
+
+@app.callback(
+    [Output('category-dropdown', 'options'),
+     Output('product-dropdown', 'options')],
+    [Input('data-generation', 'data')],
+    prevent_initial_call=True
+)
+def update_filters(generation):
+    categories, products = get_filters_data(generation)
+    return dropdown_options(categories), dropdown_options(products)
+
+@app.callback(
+    [Output('avg-price-plot', 'figure'),
+     Output('total-revenue-plot', 'figure'),
+     Output('highest-sales-day-plot', 'figure')],
+    [Input('data-generation', 'data')],
+    prevent_initial_call=True
+)
+def update_aggregated_figs(generation):
+    revenue_fig, avg_price_fig, highest_sales_day_fig = get_aggregated_figs(generation)
+    return avg_price_fig, revenue_fig, highest_sales_day_fig
+
+@app.callback(
+    [Output('json-table', 'data'),
+     Output('json-table', 'page_count'),
+     Output('json-table', 'columns'),
+     Output('outliers-message', 'children'),
+     Output('outliers-cursors', 'data')],
+    [Input('json-table', 'page_current'),
+     Input('json-table', 'page_size'),
+     Input('json-table', 'sort_by'),
+     Input('json-table', 'filter_query'),
+     Input('data-generation', 'data')],
+    [State('outliers-cursors', 'data')],
+    prevent_initial_call=True
+)
+def update_outliers_table(page_current, page_size, sort_by, filter_query, generation, cursors):
+    # Cursors are only valid for the data, sort and filters they were issued under
+    view = json.dumps([generation, page_size, sort_by, filter_query])
+    if not cursors or cursors.get('view') != view:
+        cursors = {'view': view, 'pages': {}}
+
+    page_current = page_current or 0
+    page = get_outliers_page(page_current, page_size, sort_by, filter_query,
+                             cursors['pages'].get(str(page_current)), generation)
+    if page['next_cursor']:
+        cursors['pages'][str(page_current + 1)] = page['next_cursor']
+    columns = outliers_columns(page['rows']) or dash.no_update
+    message = "No outliers to show" if page['total'] == 0 and not filter_query else None
+    return page['rows'], max(1, math.ceil(page['total'] / page_size)), columns, message, cursors
+
+@app.callback(
+    Output('product-sales-plot', 'figure'),
+    [Input('category-dropdown', 'value'),
+     Input('product-dropdown', 'value'),
+     Input('data-generation', 'data')],
+    prevent_initial_call=True
+)
+def update_products_plot(selected_category, selected_product, generation):
+    # Filter the data based on the selected category and product
+    params = products_params(selected_category, selected_product)
+
+    filtered_data = get_frame('/sales/product', params, generation=generation)
     if filtered_data.empty:
         return {
             'data': [],
@@ -152,22 +344,33 @@ def update_products_plot(selected_category, selected_product):
             )
         }
 
+# Measured on every generation poll, so a resized window is picked up with the next one
+app.clientside_callback(
+    """
+    function(_, currentWidth) {
+        const plot = document.getElementById('daily-sales-plot');
+        const width = plot ? plot.offsetWidth : null;
+        return width && width !== currentWidth ? width : window.dash_clientside.no_update;
+    }
+    """,
+    Output('daily-plot-width', 'data'),
+    [Input('generation-poll', 'n_intervals')],
+    [State('daily-plot-width', 'data')]
+)
+
 @app.callback(
     Output('daily-sales-plot', 'figure'),
     [Input("date-picker-range", "start_date"),
-     Input("date-picker-range", "end_date")]
+     Input("date-picker-range", "end_date"),
+     Input('data-generation', 'data'),
+     Input('daily-plot-width', 'data')],
+    prevent_initial_call=True
 )
-def update_daily_plot(start_date, end_date):
+def update_daily_plot(start_date, end_date, generation, width):
     # Filter the data based on the selected category and product
-    params = {}
-
-    if start_date:
-        params['start_date'] = start_date
-    if end_date:
-        params['end_date'] = end_date
+    params = daily_params(start_date, end_date, width)
 
-    filtered_data = requests.get('http://backend:8000/sales/day', params=params).json()
-    filtered_data = pd.DataFrame(filtered_data)
+    filtered_data = get_frame('/sales/day', params, generation=generation)
     if filtered_data.empty:
         return {
             'data': [],
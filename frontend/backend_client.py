@@ -0,0 +1,222 @@
+import base64
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import pyarrow as pa
+except ImportError:  # without pyarrow, frames are fetched as column-oriented JSON
+    pa = None
+
+# Backend client configuration
+BACKEND_URL = os.getenv('BACKEND_URL', 'http://backend:8000')
+CONNECT_TIMEOUT = float(os.getenv('BACKEND_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.getenv('BACKEND_READ_TIMEOUT', '30'))
+RETRIES = int(os.getenv('BACKEND_RETRIES', '3'))
+POOL_SIZE = int(os.getenv('BACKEND_POOL_SIZE', '10'))
+# Responses are reused without asking the backend for this many seconds, then revalidated
+# with their ETag, which costs a 304 with no body when the data has not changed.
+CACHE_TTL = float(os.getenv('BACKEND_CACHE_TTL', '60'))
+CACHE_MAX_ENTRIES = int(os.getenv('BACKEND_CACHE_MAX_ENTRIES', '1024'))
+# Layout requested for tables that end up in DataFrames: an Arrow stream is read straight
+# into columns, skipping JSON parsing and per-row dicts
+FRAME_FORMAT = 'arrow' if pa is not None else 'columns'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+class BackendError(Exception):
+    """Raised when the backend cannot be reached or answers with an error status."""
+
+
+def make_session(retries=RETRIES, pool_size=POOL_SIZE):
+    """A keep-alive session that retries failed connections and 502/503/504 answers of GETs."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=['GET'],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def decode_arrow(content):
+    """A DataFrame from an Arrow IPC stream, with its schema metadata in `attrs`."""
+    reader = pa.ipc.open_stream(content)
+    frame = reader.read_pandas()
+    frame.attrs.update({key.decode(): json.loads(value) for key, value in (reader.schema.metadata or {}).items()})
+    return frame
+
+
+def decode_body(content, media_type):
+    """The decoded body of a response: a DataFrame for Arrow streams, parsed JSON otherwise."""
+    if media_type and media_type.split(';')[0].strip() == ARROW_MEDIA_TYPE:
+        return decode_arrow(content)
+    return json.loads(content)
+
+
+def frame_params(params=None):
+    """`params` with the layout requested for DataFrames."""
+    return {**(params or {}), 'format': FRAME_FORMAT}
+
+
+def cache_key(path, params, generation=None):
+    """Key of a request: its path and sorted parameters, with list values kept in order."""
+    items = []
+    for name, value in sorted((params or {}).items()):
+        if value is None:
+            continue
+        items.append((name, tuple(value) if isinstance(value, (list, tuple)) else value))
+    return path, tuple(items), generation
+
+
+class BackendClient:
+    """
+    Shared client for the sales API.
+
+    All calls go through one pooled keep-alive session with timeouts and retries, which
+    accepts gzip and, when brotli is installed, br compressed bodies. Decoded responses are
+    memoized per path and parameters, so flipping a dropdown back to an earlier value is
+    answered locally. Cached values are shared between callers and must not be modified.
+    """
+
+    def __init__(self, base_url=BACKEND_URL, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), session=None):
+        self.base_url = base_url.rstrip('/')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.session = session or make_session()
+        self._lock = threading.Lock()
+        # key -> (fetched_at, etag, data)
+        self._entries = OrderedDict()
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, etag, data):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), etag, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, path, params=None, generation=None, cache=True):
+        """The decoded body of `GET path?params`, from the cache when it is fresh.
+
+        Responses are cached per `generation` as well, so passing the backend's current data
+        generation makes entries from an older one miss. `cache=False` always asks the backend.
+        """
+        key = cache_key(path, params, generation)
+        entry = self._lookup(key) if cache else None
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[2]
+
+        headers = {'If-None-Match': entry[1]} if entry is not None and entry[1] else {}
+        try:
+            response = self.session.get(f'{self.base_url}{path}', params=params, headers=headers,
+                                        timeout=self.timeout)
+        except requests.RequestException as e:
+            raise BackendError(f'GET {path} failed: {e}') from e
+        if response.status_code == 304 and entry is not None:
+            self._store(key, entry[1], entry[2])
+            return entry[2]
+        if response.status_code != 200:
+            raise BackendError(f'GET {path} returned {response.status_code}: {response.text}')
+        data = decode_body(response.content, response.headers.get('Content-Type'))
+        if cache:
+            self._store(key, response.headers.get('ETag'), data)
+        return data
+
+    def get_batch(self, queries):
+        """Runs `[(path, params), ...]` GETs in one `POST /batch` and caches their responses.
+
+        The backend answers all of them from one database snapshot. Successful responses are
+        cached under the snapshot's generation, exactly as `get_json` would have cached them, so
+        later `get_json` calls with that generation are answered locally. Returns the generation
+        and the decoded bodies in order, with None for sub-queries that failed.
+        """
+        body = {'queries': [{'path': path, 'params': params or {}} for path, params in queries]}
+        try:
+            response = self.session.post(f'{self.base_url}/batch', json=body, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise BackendError(f'POST /batch failed: {e}') from e
+        if response.status_code != 200:
+            raise BackendError(f'POST /batch returned {response.status_code}: {response.text}')
+        batch = response.json()
+        generation = batch['generation']
+        results = []
+        for (path, params), result in zip(queries, batch['results']):
+            if result['status'] != 200:
+                print(f"Error: GET {path} in batch returned {result['status']}: {result['body']}")
+                results.append(None)
+                continue
+            data = result['body']
+            if result['media_type'] != 'application/json':
+                data = decode_body(base64.b64decode(data), result['media_type'])
+            self._store(cache_key(path, params, generation), result['etag'], data)
+            results.append(data)
+        return generation, results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide backend client, created on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = BackendClient()
+        return _client
+
+
+def prefetch(queries):
+    """Loads `[(path, params), ...]` into the cache with one batch call.
+
+    Returns the generation the responses were cached under, or None when the batch failed.
+    """
+    try:
+        generation, _ = get_client().get_batch(queries)
+        return generation
+    except BackendError as e:
+        print(f"Error: {e}")
+        return None
+
+
+def get_json(path, params=None, default=None, generation=None, cache=True):
+    """`get_client().get`, returning `default` and printing the error when the call fails."""
+    try:
+        return get_client().get(path, params, generation, cache)
+    except BackendError as e:
+        print(f"Error: {e}")
+        return default
+
+
+def get_frame(path, params=None, generation=None):
+    """A tabular endpoint as a DataFrame, or an empty one when the call fails."""
+    data = get_json(path, frame_params(params), generation=generation)
+    if data is None:
+        return pd.DataFrame()
+    return data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)